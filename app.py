@@ -1,11 +1,119 @@
-from pipeline import run_pipeline
-from fastapi import FastAPI, Query
+from pipeline import run_pipeline, run_pipeline_async
+from pipeline.final_pipeline import fetch_watermark, fetch_watermark_async, run_metrics_async
+from pipeline.windows import resolve_window
+from pipeline.create_pdf import get_profile, output_variant
+from pipeline.report_cache import ReportCache, report_cache_key
+from pipeline.parallel import warm_render_pool, shutdown_render_pool
+from pipeline.pages import warm_up
+from pipeline.jobs import ReportJobQueue, QueueFullError
+from pipeline.instrumentation import request_id, trace, CACHE_LOOKUPS
+from pipeline.single_flight import SingleFlight
+from pipeline.admission import AdmissionController, AdmissionRejected
+from pipeline.prebuild import PrebuildScheduler, get_prebuild_store, parse_hours, run_prebuild
+from database import init_engines, dispose_engines
+from config import (
+    PDF_BACKEND,
+    RENDER_MODE,
+    RENDER_WARM_UP,
+    REPORT_CACHE_DIR,
+    REPORT_CACHE_MAX_ENTRIES,
+    REPORT_CACHE_MAX_MEMORY_BYTES,
+    REPORT_CACHE_MAX_DISK_BYTES,
+    REPORT_CACHE_TTL,
+    REPORT_JOB_WORKERS,
+    REPORT_JOB_QUEUE_DEPTH,
+    REPORT_JOB_RETENTION,
+    ADMISSION_CAPACITY,
+    ADMISSION_QUEUE_DEPTH,
+    ADMISSION_QUEUE_TIMEOUT,
+    ADMISSION_ROWS_PER_UNIT,
+    ADMISSION_RETRY_AFTER,
+    PREBUILD_HOURS
+)
+from contextlib import asynccontextmanager
+from datetime import date, timezone
+from email.utils import format_datetime
+from fastapi import FastAPI, Header, HTTPException, Query, Request, Response
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+import asyncio
+import time
+import uuid
 import uvicorn
-import os
 
-app = FastAPI()
+# Generated reports, keyed by merchant, reporting window and data watermark.
+# Opened in lifespan, like the pre-build store, so importing the app touches no files.
+report_cache = None
+
+def run_report_job(merchant_id, start=None, end=None, period=None, profile=None):
+    # Jobs take their cost from the same admission controller as requests
+    with admission.hold(admission.cost(fetch_watermark(merchant_id).get("row_count"))):
+        return run_pipeline(merchant_id, start=start, end=end, period=period, profile=profile)
+
+
+# Reports requested through the job API, built by background workers
+report_jobs = ReportJobQueue(
+    run_report_job,
+    concurrency=REPORT_JOB_WORKERS,
+    max_queue=REPORT_JOB_QUEUE_DEPTH,
+    max_finished=REPORT_JOB_RETENTION
+)
+
+# Identical reports requested at the same time are generated once
+report_flights = SingleFlight("report")
+metrics_flights = SingleFlight("metrics")
+
+# Builds the default reports of active merchants off-peak, prioritised by
+# the requests counted in the store
+prebuild_store = None
+prebuild_scheduler = None
+
+# Limits how many (and how large) reports are generated at once, on demand,
+# as jobs or pre-built
+admission = AdmissionController(
+    capacity=ADMISSION_CAPACITY,
+    max_queue=ADMISSION_QUEUE_DEPTH,
+    timeout=ADMISSION_QUEUE_TIMEOUT,
+    rows_per_unit=ADMISSION_ROWS_PER_UNIT,
+    retry_after=ADMISSION_RETRY_AFTER
+)
+
+
+@asynccontextmanager
+async def lifespan(app):
+    global report_cache, prebuild_store, prebuild_scheduler
+    report_cache = ReportCache(
+        REPORT_CACHE_DIR,
+        max_entries=REPORT_CACHE_MAX_ENTRIES,
+        max_memory_bytes=REPORT_CACHE_MAX_MEMORY_BYTES,
+        max_disk_bytes=REPORT_CACHE_MAX_DISK_BYTES,
+        ttl=REPORT_CACHE_TTL
+    )
+    prebuild_store = get_prebuild_store()
+    prebuild_scheduler = PrebuildScheduler(
+        prebuild_store,
+        lambda: run_prebuild(report_cache, prebuild_store, admission=admission),
+        hours=parse_hours(PREBUILD_HOURS)
+    )
+    admission.bind(asyncio.get_running_loop())
+    # Create the pooled database engine once per process
+    init_engines()
+    if RENDER_WARM_UP:
+        warm_up()
+    if RENDER_MODE == "parallel":
+        warm_render_pool()
+    report_jobs.start()
+    prebuild_scheduler.start()
+    yield
+    # Workers may be waiting for admission on this loop, so they are joined off it
+    await asyncio.to_thread(prebuild_scheduler.stop)
+    await asyncio.to_thread(report_jobs.stop)
+    shutdown_render_pool()
+    dispose_engines()
+
+
+app = FastAPI(lifespan=lifespan)
 
 # Add CORS configuration
 app.add_middleware(
@@ -16,27 +124,197 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def tag_request(request: Request, call_next):
+    # Every trace line of the request carries this id, echoed back to the client
+    rid = request.headers.get("X-Request-ID") or uuid.uuid4().hex
+    token = request_id.set(rid)
+    started = time.perf_counter()
+    try:
+        response = await call_next(request)
+        trace("request", path=request.url.path, status=response.status_code,
+              seconds=round(time.perf_counter() - started, 4))
+    finally:
+        request_id.reset(token)
+    response.headers["X-Request-ID"] = rid
+    return response
+
 @app.get("/")
 def welcome_message():
     return {"Merchant Report Creator": "Welcome to the Merchant Report Creator API"}
 
+def report_headers(etag, last_modified):
+    # Validators let dashboards poll with If-None-Match and get a 304
+    return {
+        "ETag": f'"{etag}"',
+        "Last-Modified": format_datetime(last_modified.replace(tzinfo=timezone.utc), usegmt=True),
+        "Cache-Control": "private, no-cache",
+        "Content-Disposition": 'attachment; filename="merchant_report.pdf"'
+    }
+
+
+def etag_matches(if_none_match, etag):
+    if not if_none_match:
+        return False
+    tags = [tag.strip().removeprefix("W/").strip('"') for tag in if_none_match.split(",")]
+    return "*" in tags or etag in tags
+
+
+def get_window(start, end, period):
+    try:
+        return resolve_window(start, end, period)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
+
+def get_merchant_id(merchant_id):
+    # Merchant ids end up in cache keys and snapshot paths, so only whole numbers pass
+    try:
+        return str(int(merchant_id))
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid merchant_id: {merchant_id!r}")
+
+
+def get_output_profile(name):
+    try:
+        return get_profile(name)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
+
+def rejected_response(exc):
+    return JSONResponse(
+        status_code=exc.status_code,
+        content={"error": str(exc)},
+        headers={"Retry-After": str(exc.retry_after)}
+    )
+
+
+@app.get("/report/metrics")
+async def get_report_metrics(
+    merchant_id: str = Query(..., description="The ID of the merchant to compute the report metrics for"),
+    start: date = Query(None, description="First day of the report window"),
+    end: date = Query(None, description="Last day of the report window"),
+    period: str = Query(None, description='Named period: "month", "quarter", "year" or e.g. "2025Q1"'),
+    if_none_match: str = Header(None)
+):
+    # Same validators as the PDF, so polling dashboards get a 304 when nothing changed
+    merchant_id = get_merchant_id(merchant_id)
+    window = get_window(start, end, period)
+    watermark = await fetch_watermark_async(merchant_id)
+    key = report_cache_key(merchant_id, window.key, watermark, "metrics")
+    headers = report_headers(key, watermark.get("last_payment") or window.end)
+    del headers["Content-Disposition"]
+    if etag_matches(if_none_match, key):
+        return Response(status_code=304, headers=headers)
+
+    # KPIs and daily series only, no rendering, computed once for concurrent identical requests
+    async def compute():
+        async with admission.admit(admission.cost(watermark.get("row_count"))):
+            metrics = await run_metrics_async(merchant_id, start, end, period)
+        return metrics.to_dict()
+
+    try:
+        content = await metrics_flights.run(key, compute)
+    except AdmissionRejected as exc:
+        return rejected_response(exc)
+    return JSONResponse(content=content, headers=headers)
+
+
 @app.get("/report/")
-def get_report(merchant_id: str = Query(..., description="The ID of the merchant to generate a report for")):
-    # Run the pipeline with the provided merchant_id (this should generate the PDF)
-    run_pipeline(merchant_id=merchant_id)
-    
-    # Set the path to the generated PDF
-    pdf_path = "artifacts/merchant_report.pdf"
-    
-    # Ensure the file exists before attempting to return it
-    if os.path.exists(pdf_path):
-        return FileResponse(
-            path=pdf_path,
-            filename="merchant_report.pdf",
-            media_type="application/pdf"
-        )
-    else:
-        return {"error": "Report not found."}
+async def get_report(
+    merchant_id: str = Query(..., description="The ID of the merchant to generate a report for"),
+    start: date = Query(None, description="First day of the report window"),
+    end: date = Query(None, description="Last day of the report window"),
+    period: str = Query(None, description='Named period: "month", "quarter", "year" or e.g. "2025Q1"'),
+    profile: str = Query(None, description='Output profile: "screen", "print" or "archive"'),
+    if_none_match: str = Header(None)
+):
+    # Identify the report by merchant, reporting window, data watermark and output
+    merchant_id = get_merchant_id(merchant_id)
+    window = get_window(start, end, period)
+    profile = get_output_profile(profile).name
+    prebuild_store.record_request(merchant_id)
+    watermark = await fetch_watermark_async(merchant_id)
+    key = report_cache_key(merchant_id, window.key, watermark, output_variant(PDF_BACKEND, profile))
+    last_modified = watermark.get("last_payment") or window.end
+
+    # The client already has this exact report
+    headers = report_headers(key, last_modified)
+    if etag_matches(if_none_match, key):
+        CACHE_LOOKUPS.labels(result="not_modified").inc()
+        return Response(status_code=304, headers=headers)
+
+    # Served straight from the cache when the report was pre-built off-peak.
+    # Cache reads and writes may hit the disk, so they run in a worker thread.
+    cached = await asyncio.to_thread(report_cache.get, key)
+    CACHE_LOOKUPS.labels(result="miss" if cached is None else "hit").inc()
+    if cached is None:
+        # Run the pipeline with the provided merchant_id, the PDF comes back in memory.
+        # Concurrent requests for the same key wait on this one generation,
+        # which waits for capacity sized by the merchant's row count.
+        async def generate():
+            async with admission.admit(admission.cost(watermark.get("row_count"))):
+                pdf = await run_pipeline_async(merchant_id=merchant_id, start=start, end=end, period=period,
+                                               profile=profile)
+            return await asyncio.to_thread(report_cache.put, key, pdf, last_modified) if pdf else None
+
+        try:
+            cached = await report_flights.run(key, generate)
+        except AdmissionRejected as exc:
+            return rejected_response(exc)
+        if cached is None:
+            return {"error": "Report not found."}
+
+    return Response(content=cached.content, media_type="application/pdf", headers=headers)
+
+@app.get("/metrics")
+def get_metrics():
+    # Prometheus scrape endpoint: stage timings, loaded rows, report sizes, cache lookups, admission queue
+    return Response(content=generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+@app.post("/report/jobs", status_code=202)
+def create_report_job(
+    merchant_id: str = Query(..., description="The ID of the merchant to generate a report for"),
+    start: date = Query(None, description="First day of the report window"),
+    end: date = Query(None, description="Last day of the report window"),
+    period: str = Query(None, description='Named period: "month", "quarter", "year" or e.g. "2025Q1"'),
+    profile: str = Query(None, description='Output profile: "screen", "print" or "archive"')
+):
+    # Queue the report and return immediately with the job id. The window
+    # and profile are checked now, and the window is resolved when the job runs.
+    merchant_id = get_merchant_id(merchant_id)
+    get_window(start, end, period)
+    profile = get_output_profile(profile).name
+    try:
+        job = report_jobs.submit(merchant_id, start=start, end=end, period=period, profile=profile)
+    except QueueFullError as exc:
+        return JSONResponse(status_code=429, content={"error": str(exc)}, headers={"Retry-After": "30"})
+    return job.to_dict()
+
+
+def get_job_or_404(job_id):
+    job = report_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found.")
+    return job
+
+
+@app.get("/report/jobs/{job_id}")
+def get_report_job(job_id: str):
+    return get_job_or_404(job_id).to_dict()
+
+
+@app.get("/report/jobs/{job_id}/download")
+def download_report_job(job_id: str):
+    job = get_job_or_404(job_id)
+    if job.status != "done":
+        return JSONResponse(status_code=409, content=job.to_dict())
+    return Response(
+        content=job.result,
+        media_type="application/pdf",
+        headers={"Content-Disposition": 'attachment; filename="merchant_report.pdf"'}
+    )
 
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=5000)
\ No newline at end of file
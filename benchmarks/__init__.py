@@ -0,0 +1,11 @@
+from .synthetic import generate_report_rows, generate_user_states, write_synthetic
+from .run import run_benchmarks, compare_runs, over_budget
+
+__all__ = [
+    "generate_report_rows",
+    "generate_user_states",
+    "write_synthetic",
+    "run_benchmarks",
+    "compare_runs",
+    "over_budget"
+]
@@ -0,0 +1,236 @@
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+import argparse
+import gc
+import json
+import os
+import platform
+import resource
+import sys
+import time
+import tracemalloc
+import pandas as pd
+
+# Add the root directory to sys.path
+root_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(root_path)
+from benchmarks.synthetic import write_synthetic
+from database.schema import conform_report_frame
+from pipeline.metrics import metrics_from_frame, compute_metrics_bulk
+from pipeline.pages import REPORT_PAGES, render_page, render_report, warm_up
+from pipeline.create_pdf import PDF_PROFILES, assemble_pdf, get_profile
+from config import PDF_BACKEND, PDF_PROFILE, REPORT_WINDOW_DAYS, TOP_STATES
+
+DEFAULT_TIERS = [10000, 100000, 1000000]
+DEFAULT_DATA_DIR = "artifacts/bench"
+
+
+def _rss_bytes():
+    # Current resident set size, from /proc where available
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class StageTimer:
+    """
+    Times named stages and records the peak memory allocated inside each
+    one (tracemalloc, which also sees numpy and pandas buffers).
+    """
+
+    def __init__(self, trace_memory=True):
+        self.trace_memory = trace_memory
+        self.stages = {}
+
+    @contextmanager
+    def stage(self, name):
+        gc.collect()
+        if self.trace_memory:
+            tracemalloc.start()
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - started
+            peak = None
+            if self.trace_memory:
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+            self.stages[name] = {"seconds": round(seconds, 4), "peak_bytes": peak}
+
+
+def run_tier(rows, data_dir=DEFAULT_DATA_DIR, merchants=100, backend=PDF_BACKEND,
+             soak=0, trace_memory=True, seed=0, profile=PDF_PROFILE):
+    """
+    Benchmarks one size tier on synthetic data and returns its results.
+    The data is generated once per (rows, merchants, seed) and reused.
+    The report is built for merchant 1, the busiest one, and checked
+    against the size budget of the output profile.
+    """
+    path = os.path.join(data_dir, f"report_{rows}_{merchants}_{seed}.parquet")
+    if not os.path.exists(path):
+        print(f"Generating {rows} rows into {path}")
+        write_synthetic(path, rows, merchants=merchants, seed=seed)
+
+    timer = StageTimer(trace_memory)
+    with timer.stage("load"):
+        frame = conform_report_frame(pd.read_parquet(path))
+    end = frame['payment_date'].max() + timedelta(minutes=1)
+    start = end - timedelta(days=REPORT_WINDOW_DAYS)
+
+    with timer.stage("metrics"):
+        metrics = metrics_from_frame(frame, 1, start, end, top_states=TOP_STATES)
+
+    with timer.stage("metrics_bulk"):
+        user_state = frame.groupby(['merchant_id', 'user_id'], observed=True)['state'].first()
+        compute_metrics_bulk(
+            frame,
+            start,
+            end,
+            total_users=frame.groupby('merchant_id')['user_id'].nunique().to_dict(),
+            total_platform_users=len(frame),
+            user_state_dist=user_state.groupby(level='merchant_id').value_counts(),
+            top_states=TOP_STATES
+        )
+
+    pages = []
+    for index, (name, renderer, section, savefig_kwargs) in enumerate(REPORT_PAGES):
+        with timer.stage(f"render:{name}"):
+            pages.append(render_page(index, getattr(metrics, section), backend, profile))
+
+    with timer.stage("assemble"):
+        pdf = assemble_pdf(pages, backend, profile=profile)
+
+    result = {
+        "rows": rows,
+        "merchants": merchants,
+        "window_rows": metrics.count.total_count,
+        "frame_bytes": int(frame.memory_usage(deep=True).sum()),
+        "pdf_bytes": len(pdf),
+        "pdf_budget_bytes": get_profile(profile).max_bytes,
+        "stages": timer.stages
+    }
+
+    if soak:
+        # Repeated reports in one process, resident memory should stay flat
+        del frame
+        gc.collect()
+        rss_start = _rss_bytes()
+        started = time.perf_counter()
+        for _ in range(soak):
+            render_report(metrics, backend, profile)
+        gc.collect()
+        result["soak"] = {
+            "reports": soak,
+            "seconds_per_report": round((time.perf_counter() - started) / soak, 4),
+            "rss_start_bytes": rss_start,
+            "rss_end_bytes": _rss_bytes()
+        }
+    return result
+
+
+def run_benchmarks(tiers=DEFAULT_TIERS, data_dir=DEFAULT_DATA_DIR, merchants=100,
+                   backend=PDF_BACKEND, soak=0, trace_memory=True, seed=0, profile=PDF_PROFILE):
+    """
+    Benchmarks every size tier and returns the run as a JSON-ready dict.
+    """
+    # Keep the plotting import and font cache out of the first render's timing
+    warm_up()
+    run = {
+        "generated_at": datetime.now().isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "pandas": pd.__version__,
+        "backend": backend,
+        "profile": profile,
+        "tiers": []
+    }
+    for rows in tiers:
+        print(f"Benchmarking {rows} rows")
+        run["tiers"].append(run_tier(rows, data_dir, merchants, backend, soak, trace_memory, seed, profile))
+    run["peak_rss_bytes"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    return run
+
+
+def compare_runs(baseline, current, tolerance=0.2, min_seconds=0.05):
+    """
+    Compares two benchmark runs stage by stage. Returns a list of
+    (rows, stage, baseline_seconds, current_seconds) for every stage that
+    got slower than tolerance allows; stages under min_seconds are noise.
+    """
+    baseline_tiers = {tier["rows"]: tier for tier in baseline["tiers"]}
+    regressions = []
+    for tier in current["tiers"]:
+        previous = baseline_tiers.get(tier["rows"])
+        if previous is None:
+            continue
+        for name, stage in tier["stages"].items():
+            before = previous["stages"].get(name, {}).get("seconds")
+            if before is None or max(before, stage["seconds"]) < min_seconds:
+                continue
+            if stage["seconds"] > before * (1 + tolerance):
+                regressions.append((tier["rows"], name, before, stage["seconds"]))
+    return regressions
+
+
+def over_budget(run):
+    """
+    Returns (rows, pdf_bytes, budget) for every tier whose report is larger
+    than the size budget of its output profile.
+    """
+    return [
+        (tier["rows"], tier["pdf_bytes"], tier["pdf_budget_bytes"])
+        for tier in run["tiers"]
+        if tier.get("pdf_budget_bytes") and tier["pdf_bytes"] > tier["pdf_budget_bytes"]
+    ]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the report pipeline on synthetic data.")
+    parser.add_argument("--tiers", default=",".join(str(rows) for rows in DEFAULT_TIERS),
+                        help="Comma-separated row counts")
+    parser.add_argument("--merchants", type=int, default=100)
+    parser.add_argument("--backend", default=PDF_BACKEND, choices=["vector", "raster"])
+    parser.add_argument("--profile", default=PDF_PROFILE, choices=list(PDF_PROFILES))
+    parser.add_argument("--data-dir", default=DEFAULT_DATA_DIR, help="Where generated tiers are cached")
+    parser.add_argument("--soak", type=int, default=0, help="Extra reports rendered per tier to check memory stays flat")
+    parser.add_argument("--no-trace-memory", action="store_true", help="Skip tracemalloc (faster, no per-stage peaks)")
+    parser.add_argument("--output", help="JSON file the results are written to (default: stdout)")
+    parser.add_argument("--baseline", help="Earlier results to compare against, exits 1 on a regression")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed slowdown per stage, as a fraction")
+    args = parser.parse_args(argv)
+
+    run = run_benchmarks(
+        [int(rows) for rows in args.tiers.split(",")],
+        args.data_dir,
+        args.merchants,
+        args.backend,
+        args.soak,
+        not args.no_trace_memory,
+        profile=args.profile
+    )
+    output = json.dumps(run, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+        print(f"Results written to {args.output}")
+    else:
+        print(output)
+
+    failed = False
+    for rows, size, budget in over_budget(run):
+        print(f"Report at {rows} rows is {size} bytes, over the {args.profile} budget of {budget}")
+        failed = True
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare_runs(baseline, run, args.tolerance)
+        for rows, name, before, after in regressions:
+            print(f"Regression at {rows} rows in {name}: {before:.3f}s -> {after:.3f}s")
+        failed = failed or bool(regressions)
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,165 @@
+from datetime import datetime
+import argparse
+import os
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+US_STATES = [
+    "Alabama", "Alaska", "Arizona", "Arkansas", "California", "Colorado", "Connecticut", "Delaware",
+    "District of Columbia", "Florida", "Georgia", "Hawaii", "Idaho", "Illinois", "Indiana", "Iowa",
+    "Kansas", "Kentucky", "Louisiana", "Maine", "Maryland", "Massachusetts", "Michigan", "Minnesota",
+    "Mississippi", "Missouri", "Montana", "Nebraska", "Nevada", "New Hampshire", "New Jersey",
+    "New Mexico", "New York", "North Carolina", "North Dakota", "Ohio", "Oklahoma", "Oregon",
+    "Pennsylvania", "Rhode Island", "South Carolina", "South Dakota", "Tennessee", "Texas", "Utah",
+    "Vermont", "Virginia", "Washington", "West Virginia", "Wisconsin", "Wyoming"
+]
+BUSINESS_TYPES = ["Electric", "water", "Gas", "Internet", "Telephone", "Insurance", "Education"]
+DEFAULT_STATUS_MIX = {"success": 0.7, "failed": 0.2, "pending": 0.1}
+
+
+def _weights(n, skew):
+    # Zipf-like weights, so a few merchants (and states) carry most of the rows
+    weights = 1.0 / np.arange(1, n + 1) ** skew
+    return weights / weights.sum()
+
+
+def generate_user_states(users=50000, states=len(US_STATES), seed=0):
+    """
+    Draws the state every user lives in, indexed by user_id.
+    """
+    rng = np.random.default_rng(seed)
+    return rng.choice(states, size=users + 1, p=_weights(states, 0.8))
+
+
+def generate_report_rows(rows, merchants=100, users=50000, states=len(US_STATES), status_mix=None,
+                         end=None, days=180, merchant_skew=1.0, seed=0, user_state=None):
+    """
+    Generates rows shaped like v3_full_report.
+    Merchants get Zipf-distributed volumes (merchant 1 is the busiest),
+    every user lives in one state, statuses follow status_mix and payments
+    are spread uniformly over the days before end.
+    user_state comes from generate_user_states, drawn here from seed if not given.
+    Repeated strings are returned as categoricals to keep large tiers small.
+    """
+    rng = np.random.default_rng(seed)
+    status_mix = status_mix or DEFAULT_STATUS_MIX
+    end = pd.Timestamp(end or datetime.now()).floor("min")
+    state_names = np.array(US_STATES[:states])
+    if user_state is None:
+        user_state = generate_user_states(users, states, seed)
+
+    merchant_id = rng.choice(np.arange(1, merchants + 1), size=rows, p=_weights(merchants, merchant_skew))
+    user_id = rng.integers(1, users + 1, size=rows)
+    statuses = np.array(list(status_mix))
+    status = rng.choice(len(statuses), size=rows, p=np.array(list(status_mix.values())) / sum(status_mix.values()))
+
+    amount = np.round(rng.lognormal(mean=5.5, sigma=1.0, size=rows), 2)
+    paid_amount = np.round(amount * rng.uniform(0.2, 1.0, size=rows), 2)
+    fee = np.round(rng.uniform(0.5, 10.0, size=rows), 2)
+    commission_amount = np.round(rng.uniform(0.5, 10.0, size=rows), 2)
+    seconds = rng.integers(0, days * 24 * 3600, size=rows)
+    payment_date = (end - pd.to_timedelta(seconds, unit="s")).floor("min")
+
+    merchant_codes = merchant_id - 1
+    merchant_names = [f"Merchant {i}" for i in range(1, merchants + 1)]
+    return pd.DataFrame({
+        "bill_id": pd.RangeIndex(rows).astype(str),
+        "merchant_id": merchant_id,
+        "legal_name": pd.Categorical.from_codes(merchant_codes, merchant_names),
+        "commercial_name": pd.Categorical.from_codes(merchant_codes, merchant_names),
+        "business_type": pd.Categorical.from_codes(merchant_codes % len(BUSINESS_TYPES), BUSINESS_TYPES),
+        "amount": amount,
+        "paid_amount": paid_amount,
+        "fee": fee,
+        "commission_amount": commission_amount,
+        "status": pd.Categorical.from_codes(status, statuses),
+        "payment_date": payment_date,
+        "user_id": user_id,
+        "state": pd.Categorical.from_codes(user_state[user_id], state_names)
+    })
+
+
+def write_synthetic(path, rows, chunk_rows=1000000, seed=0, users=50000, states=len(US_STATES), end=None,
+                    **kwargs):
+    """
+    Writes a synthetic v3_full_report to a Parquet file in chunks of
+    chunk_rows, so tiers of tens of millions of rows fit in memory.
+    Every chunk uses its own seed derived from seed, but all chunks share
+    one user to state map and one end, so a user keeps a single state.
+    """
+    user_state = generate_user_states(users, states, seed)
+    end = end or datetime.now()
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = path + ".tmp"
+    writer = None
+    try:
+        for index, offset in enumerate(range(0, rows, chunk_rows)):
+            chunk = generate_report_rows(min(chunk_rows, rows - offset), users=users, states=states, end=end,
+                                         seed=seed + index, user_state=user_state, **kwargs)
+            chunk["bill_id"] = (chunk.index + offset).astype(str)
+            # Categories differ between chunks, so store plain strings
+            table = pa.Table.from_pandas(chunk, preserve_index=False).cast(_plain_schema(chunk))
+            if writer is None:
+                writer = pq.ParquetWriter(tmp_path, table.schema)
+            writer.write_table(table)
+    finally:
+        if writer is not None:
+            writer.close()
+    os.replace(tmp_path, path)
+    return path
+
+
+def _plain_schema(chunk):
+    fields = []
+    for field in pa.Schema.from_pandas(chunk, preserve_index=False):
+        if pa.types.is_dictionary(field.type):
+            field = field.with_type(field.type.value_type)
+        fields.append(field)
+    return pa.schema(fields)
+
+
+def parse_status_mix(value):
+    """
+    Parses a status mix like "success=0.7,failed=0.2,pending=0.1".
+    """
+    try:
+        mix = {status.strip(): float(weight) for status, weight in (item.split("=") for item in value.split(","))}
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Expected status=weight pairs, got {value!r}")
+    if not mix or any(weight < 0 for weight in mix.values()) or sum(mix.values()) <= 0:
+        raise argparse.ArgumentTypeError(f"Status weights must be non-negative with a positive sum, got {value!r}")
+    return mix
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Write a synthetic v3_full_report to Parquet.")
+    parser.add_argument("--output", required=True, help="Parquet file to write")
+    parser.add_argument("--rows", type=int, default=1000000)
+    parser.add_argument("--merchants", type=int, default=100)
+    parser.add_argument("--users", type=int, default=50000)
+    parser.add_argument("--states", type=int, default=len(US_STATES))
+    parser.add_argument("--days", type=int, default=180, help="Days of payments before now")
+    parser.add_argument("--merchant-skew", type=float, default=1.0)
+    parser.add_argument("--status-mix", type=parse_status_mix, default=DEFAULT_STATUS_MIX,
+                        help='Status weights, e.g. "success=0.7,failed=0.2,pending=0.1"')
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+    write_synthetic(
+        args.output,
+        args.rows,
+        merchants=args.merchants,
+        users=args.users,
+        states=args.states,
+        days=args.days,
+        merchant_skew=args.merchant_skew,
+        status_mix=args.status_mix,
+        seed=args.seed
+    )
+    print(f"Wrote {args.rows} rows to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -3,6 +3,9 @@ from dotenv import load_dotenv
 import certifi
 
 load_dotenv()
+
+# Repository root, so data paths do not depend on the working directory
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
 # Database config
 DB_USERNAME = os.getenv('DB_USERNAME')
 DB_PASSWORD = os.getenv('DB_PASSWORD')
@@ -19,6 +22,12 @@ DB_URL = (
     f"?ssl_ca={ssl_ca_path}"
 )
 
+# Connection pool settings, shared by every report in the process
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 5))
+DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', 5))
+DB_POOL_TIMEOUT = int(os.getenv('DB_POOL_TIMEOUT', 30))
+DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', 1800))
+
 # List of image paths
 IMAGE_PATHS = [
     "artifacts/payment_analysis_last_month.png",
@@ -29,4 +38,120 @@ IMAGE_PATHS = [
 ]
 
 # Output PDF path
-PDF_PATH = "artifacts/merchant_report.pdf"
\ No newline at end of file
+PDF_PATH = "artifacts/merchant_report.pdf"
+
+# Sample export of the report view, used when running the page modules directly
+MOCK_DATA_PATH = os.path.join(ROOT_DIR, "Data", "MOCK_DATA.csv")
+
+# Load the plotting stack and font cache when the service starts
+RENDER_WARM_UP = os.getenv('RENDER_WARM_UP', '1') == '1'
+
+# How pages are written to the PDF: "vector" (matplotlib PDF backend)
+# or "raster" (PNG pages at the output profile's resolution)
+PDF_BACKEND = os.getenv('PDF_BACKEND', 'vector')
+
+# Default output profile of the PDF: "screen" (100 dpi, 64-colour palette,
+# base-14 fonts), "print" (200 dpi, 256-colour palette, embedded fonts) or
+# "archive" (300 dpi RGB, embedded fonts, nothing rasterized),
+# see pipeline.create_pdf.PDF_PROFILES
+PDF_PROFILE = os.getenv('PDF_PROFILE', 'print')
+
+# How pages are rendered: "serial" (in the request's thread) or
+# "parallel" (on a warm process pool with RENDER_WORKERS processes)
+RENDER_MODE = os.getenv('RENDER_MODE', 'serial')
+RENDER_WORKERS = int(os.getenv('RENDER_WORKERS', os.cpu_count() or 1))
+
+# Reporting view and the columns the report pages read from it
+REPORT_VIEW = "`reporting-db`.v3_full_report"
+REPORT_COLUMNS = [
+    "merchant_id",
+    "paid_amount",
+    "fee",
+    "commission_amount",
+    "status",
+    "payment_date",
+    "user_id",
+    "state"
+]
+
+# Number of days covered by the report
+REPORT_WINDOW_DAYS = 30
+
+# Number of states shown on the distribution page
+TOP_STATES = 10
+
+# Write a JSON trace line per report stage, tagged with the request id
+REPORT_TRACE_LOGS = os.getenv('REPORT_TRACE_LOGS', '0') == '1'
+
+# Report cache (in-memory LRU in front of an on-disk store)
+REPORT_CACHE_DIR = os.getenv('REPORT_CACHE_DIR', os.path.join(ROOT_DIR, 'artifacts', 'cache'))
+REPORT_CACHE_MAX_ENTRIES = int(os.getenv('REPORT_CACHE_MAX_ENTRIES', 128))
+REPORT_CACHE_MAX_MEMORY_BYTES = int(os.getenv('REPORT_CACHE_MAX_MEMORY_BYTES', 256 * 1024 * 1024))
+REPORT_CACHE_MAX_DISK_BYTES = int(os.getenv('REPORT_CACHE_MAX_DISK_BYTES', 2 * 1024 * 1024 * 1024))
+REPORT_CACHE_TTL = int(os.getenv('REPORT_CACHE_TTL', 3600))
+
+# A merchant's row checksum scans its whole history, so each process reuses
+# it for this many seconds: in-place row updates show up in the report
+# watermark within this delay, new rows right away through the row count
+WATERMARK_CHECKSUM_TTL = int(os.getenv('WATERMARK_CHECKSUM_TTL', 300))
+
+# Platform-wide totals count the whole view, so each process reuses them
+# for this many seconds
+PLATFORM_TOTALS_TTL = int(os.getenv('PLATFORM_TOTALS_TTL', 600))
+
+# Rendered pages, keyed by a hash of the metrics each page draws from, so
+# a report only re-renders the pages whose inputs changed
+PAGE_CACHE_DIR = os.getenv('PAGE_CACHE_DIR', os.path.join(ROOT_DIR, 'artifacts', 'page_cache'))
+PAGE_CACHE_MAX_ENTRIES = int(os.getenv('PAGE_CACHE_MAX_ENTRIES', 512))
+PAGE_CACHE_MAX_MEMORY_BYTES = int(os.getenv('PAGE_CACHE_MAX_MEMORY_BYTES', 64 * 1024 * 1024))
+PAGE_CACHE_MAX_DISK_BYTES = int(os.getenv('PAGE_CACHE_MAX_DISK_BYTES', 1024 * 1024 * 1024))
+PAGE_CACHE_TTL = int(os.getenv('PAGE_CACHE_TTL', 7 * 24 * 3600))
+
+# Admission control for every report the service builds (requests, jobs and
+# pre-builds): at most ADMISSION_CAPACITY cost units generate at once (a
+# report costs one unit per ADMISSION_ROWS_PER_UNIT rows of the merchant),
+# and up to ADMISSION_QUEUE_DEPTH requests wait for ADMISSION_QUEUE_TIMEOUT
+# seconds before getting a 503. Jobs and pre-builds wait as long as needed.
+ADMISSION_CAPACITY = int(os.getenv('ADMISSION_CAPACITY', 4))
+ADMISSION_QUEUE_DEPTH = int(os.getenv('ADMISSION_QUEUE_DEPTH', 32))
+ADMISSION_QUEUE_TIMEOUT = float(os.getenv('ADMISSION_QUEUE_TIMEOUT', 30))
+ADMISSION_ROWS_PER_UNIT = int(os.getenv('ADMISSION_ROWS_PER_UNIT', 100000))
+ADMISSION_RETRY_AFTER = int(os.getenv('ADMISSION_RETRY_AFTER', 30))
+
+# Pre-generation of the default reports of active merchants. The service
+# runs it once a day inside PREBUILD_HOURS (e.g. "1-5", local time, empty to
+# leave it to `python -m pipeline.prebuild` from cron); run it in one service
+# process only. Builds start for PREBUILD_BUDGET_SECONDS and are cached for
+# PREBUILD_TTL seconds
+PREBUILD_DB_PATH = os.getenv('PREBUILD_DB_PATH', os.path.join(ROOT_DIR, 'artifacts', 'prebuild.sqlite'))
+PREBUILD_HOURS = os.getenv('PREBUILD_HOURS', '')
+PREBUILD_WORKERS = int(os.getenv('PREBUILD_WORKERS', 1))
+PREBUILD_BUDGET_SECONDS = float(os.getenv('PREBUILD_BUDGET_SECONDS', 3600))
+PREBUILD_LOOKBACK_DAYS = int(os.getenv('PREBUILD_LOOKBACK_DAYS', 7))
+PREBUILD_TTL = int(os.getenv('PREBUILD_TTL', 24 * 3600))
+
+# Background report jobs
+REPORT_JOB_WORKERS = int(os.getenv('REPORT_JOB_WORKERS', 2))
+REPORT_JOB_QUEUE_DEPTH = int(os.getenv('REPORT_JOB_QUEUE_DEPTH', 100))
+REPORT_JOB_RETENTION = int(os.getenv('REPORT_JOB_RETENTION', 256))
+
+# Per-merchant daily rollups (refreshed with `python -m pipeline.rollups`)
+ROLLUP_DB_PATH = os.getenv('ROLLUP_DB_PATH', os.path.join(ROOT_DIR, 'artifacts', 'rollups.sqlite'))
+
+# Local Parquet snapshot of the report view, partitioned by merchant and month
+# (refreshed with `python -m pipeline.snapshot`)
+SNAPSHOT_DIR = os.getenv('SNAPSHOT_DIR', os.path.join(ROOT_DIR, 'artifacts', 'snapshot'))
+
+# Read the raw rows in chunks of this many rows and fold each one into running
+# aggregates, so memory stays bounded on large merchants (0 loads the window at once)
+STREAM_CHUNK_ROWS = int(os.getenv('STREAM_CHUNK_ROWS', 0))
+
+# Distinct-user sketches stored with the rollups: merchants with up to
+# SKETCH_EXACT_LIMIT users per sketch are counted exactly, larger ones with
+# a HyperLogLog of 2**SKETCH_PRECISION registers
+SKETCH_PRECISION = int(os.getenv('SKETCH_PRECISION', 14))
+SKETCH_EXACT_LIMIT = int(os.getenv('SKETCH_EXACT_LIMIT', 2048))
+
+# Where report metrics come from: "transactions" (raw rows of the window),
+# "rollups" (the daily rollup store) or "snapshot" (the local snapshot)
+METRICS_SOURCE = os.getenv('METRICS_SOURCE', 'transactions')
@@ -0,0 +1,39 @@
+from .engine import get_engine, init_engines, dispose_engines
+from .queries import (
+    fetch_merchant_transactions,
+    iter_merchant_transactions,
+    fetch_merchant_user_totals,
+    fetch_merchant_state_distribution,
+    fetch_platform_totals,
+    fetch_merchant_watermark,
+    fetch_merchant_watermarks,
+    fetch_merchant_window_users,
+    fetch_merchant_returning_users,
+    fetch_rollup_source,
+    fetch_snapshot_source,
+    load_report_data,
+    load_batch_data
+)
+from .schema import REPORT_SCHEMA, SchemaError, conform_report_frame
+
+__all__ = [
+    "get_engine",
+    "init_engines",
+    "dispose_engines",
+    "fetch_merchant_transactions",
+    "iter_merchant_transactions",
+    "fetch_merchant_user_totals",
+    "fetch_merchant_state_distribution",
+    "fetch_platform_totals",
+    "fetch_merchant_watermark",
+    "fetch_merchant_watermarks",
+    "fetch_merchant_window_users",
+    "fetch_merchant_returning_users",
+    "fetch_rollup_source",
+    "fetch_snapshot_source",
+    "load_report_data",
+    "load_batch_data",
+    "REPORT_SCHEMA",
+    "SchemaError",
+    "conform_report_frame"
+]
@@ -0,0 +1,55 @@
+import os
+import sys
+from sqlalchemy import create_engine
+
+# Add the root directory to sys.path
+root_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(root_path)
+from config import (
+    DB_URL,
+    DB_POOL_SIZE,
+    DB_MAX_OVERFLOW,
+    DB_POOL_TIMEOUT,
+    DB_POOL_RECYCLE
+)
+
+# One engine per process, created on first use or at startup. Async code
+# runs its queries on it in worker threads, so there is one pool to size.
+_engine = None
+
+
+def _pool_options():
+    return {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": True
+    }
+
+
+def get_engine():
+    """
+    Returns the process-wide pooled engine, creating it on first use.
+    """
+    global _engine
+    if _engine is None:
+        _engine = create_engine(DB_URL, **_pool_options())
+    return _engine
+
+
+def init_engines():
+    """
+    Creates the engine up front so the first report does not pay for it.
+    """
+    get_engine()
+
+
+def dispose_engines():
+    """
+    Closes every pooled connection. Called when the service shuts down.
+    """
+    global _engine
+    if _engine is not None:
+        _engine.dispose()
+        _engine = None
@@ -0,0 +1,365 @@
+from collections import defaultdict
+import pandas as pd
+from sqlalchemy import bindparam, text
+import os
+import sys
+import threading
+import time
+
+# Add the root directory to sys.path
+root_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(root_path)
+from config import REPORT_VIEW, REPORT_COLUMNS, TOP_STATES, WATERMARK_CHECKSUM_TTL, PLATFORM_TOTALS_TTL
+from database.schema import REPORT_SCHEMA, conform_report_frame
+
+# Columns the daily rollups are folded from
+ROLLUP_COLUMNS = ["merchant_id", "paid_amount", "fee", "commission_amount", "status", "payment_date", "user_id"]
+ROLLUP_SCHEMA = {column: REPORT_SCHEMA[column] for column in ROLLUP_COLUMNS}
+
+# Rows of one merchant inside the reporting window, in payment order
+MERCHANT_WINDOW_QUERY = text(
+    f"SELECT {', '.join(REPORT_COLUMNS)} FROM {REPORT_VIEW} "
+    "WHERE merchant_id = :merchant_id "
+    "AND payment_date >= :start AND payment_date < :end "
+    "ORDER BY payment_date"
+)
+
+# Distinct users of one merchant over its whole history
+MERCHANT_USERS_QUERY = text(
+    f"SELECT COUNT(DISTINCT user_id) AS total_users FROM {REPORT_VIEW} "
+    "WHERE merchant_id = :merchant_id"
+)
+
+# Users of one merchant per state, each user counted once
+MERCHANT_STATES_QUERY = text(
+    "SELECT user_state.state AS state, COUNT(*) AS users FROM ("
+    f"SELECT user_id, MIN(state) AS state FROM {REPORT_VIEW} "
+    "WHERE merchant_id = :merchant_id AND user_id IS NOT NULL "
+    "GROUP BY user_id"
+    ") AS user_state "
+    "GROUP BY user_state.state "
+    "ORDER BY users DESC "
+    "LIMIT :limit"
+)
+
+# Order-independent checksum of the report columns of a merchant's rows. The
+# view has no updated_at, and a status or amount change on an existing row
+# (pending -> success, a refund) moves neither the latest payment nor the count
+ROW_CHECKSUM = (
+    "SUM(CRC32(CONCAT_WS('|', paid_amount, fee, commission_amount, status, payment_date, user_id, state)))"
+)
+
+# Latest payment and row count of one merchant, used to tell whether its data changed
+MERCHANT_WATERMARK_QUERY = text(
+    f"SELECT MAX(payment_date) AS last_payment, COUNT(*) AS row_count "
+    f"FROM {REPORT_VIEW} WHERE merchant_id = :merchant_id"
+)
+
+# Row checksum of one merchant, a full scan of its history
+MERCHANT_CHECKSUM_QUERY = text(
+    f"SELECT {ROW_CHECKSUM} AS checksum FROM {REPORT_VIEW} WHERE merchant_id = :merchant_id"
+)
+
+# Latest payment, row count and row checksum of every merchant
+ALL_MERCHANTS_WATERMARK_QUERY = text(
+    f"SELECT merchant_id, MAX(payment_date) AS last_payment, COUNT(*) AS row_count, {ROW_CHECKSUM} AS checksum "
+    f"FROM {REPORT_VIEW} GROUP BY merchant_id"
+)
+
+# Rows of every merchant inside the reporting window, in payment order
+ALL_MERCHANTS_WINDOW_QUERY = text(
+    f"SELECT {', '.join(REPORT_COLUMNS)} FROM {REPORT_VIEW} "
+    "WHERE payment_date >= :start AND payment_date < :end "
+    "ORDER BY payment_date"
+)
+
+# Rows of a list of merchants inside the reporting window, in payment order
+MERCHANTS_WINDOW_QUERY = text(
+    f"SELECT {', '.join(REPORT_COLUMNS)} FROM {REPORT_VIEW} "
+    "WHERE merchant_id IN :merchant_ids "
+    "AND payment_date >= :start AND payment_date < :end "
+    "ORDER BY payment_date"
+).bindparams(bindparam("merchant_ids", expanding=True))
+
+# Distinct users of every merchant over its whole history
+ALL_MERCHANTS_USERS_QUERY = text(
+    f"SELECT merchant_id, COUNT(DISTINCT user_id) AS total_users FROM {REPORT_VIEW} "
+    "GROUP BY merchant_id"
+)
+
+# Users of every merchant per state, each user counted once per merchant
+ALL_MERCHANTS_STATES_QUERY = text(
+    "SELECT user_state.merchant_id AS merchant_id, user_state.state AS state, COUNT(*) AS users FROM ("
+    f"SELECT merchant_id, user_id, MIN(state) AS state FROM {REPORT_VIEW} "
+    "WHERE user_id IS NOT NULL "
+    "GROUP BY merchant_id, user_id"
+    ") AS user_state "
+    "GROUP BY user_state.merchant_id, user_state.state"
+)
+
+# Distinct users of one merchant inside the reporting window
+MERCHANT_WINDOW_USERS_QUERY = text(
+    f"SELECT COUNT(DISTINCT user_id) AS window_users FROM {REPORT_VIEW} "
+    "WHERE merchant_id = :merchant_id "
+    "AND payment_date >= :start AND payment_date < :end"
+)
+
+# Distinct users of one merchant's window who had already paid before it
+MERCHANT_RETURNING_USERS_QUERY = text(
+    f"SELECT COUNT(DISTINCT w.user_id) AS returning_users FROM {REPORT_VIEW} AS w "
+    "WHERE w.merchant_id = :merchant_id "
+    "AND w.payment_date >= :start AND w.payment_date < :end "
+    f"AND EXISTS (SELECT 1 FROM {REPORT_VIEW} AS p "
+    "WHERE p.merchant_id = w.merchant_id AND p.user_id = w.user_id AND p.payment_date < :start)"
+)
+
+# Same, for every merchant with payments in the window
+ALL_MERCHANTS_RETURNING_USERS_QUERY = text(
+    f"SELECT w.merchant_id AS merchant_id, COUNT(DISTINCT w.user_id) AS returning_users FROM {REPORT_VIEW} AS w "
+    "WHERE w.payment_date >= :start AND w.payment_date < :end "
+    f"AND EXISTS (SELECT 1 FROM {REPORT_VIEW} AS p "
+    "WHERE p.merchant_id = w.merchant_id AND p.user_id = w.user_id AND p.payment_date < :start) "
+    "GROUP BY w.merchant_id"
+)
+
+# Rows folded into the daily rollups, from a payment_date onwards
+ROLLUP_SOURCE_QUERY = text(
+    f"SELECT {', '.join(ROLLUP_COLUMNS)} FROM {REPORT_VIEW} WHERE payment_date >= :since"
+)
+
+# Rows exported to the local snapshot, from a payment_date onwards
+SNAPSHOT_SOURCE_QUERY = text(
+    f"SELECT {', '.join(REPORT_COLUMNS)} FROM {REPORT_VIEW} WHERE payment_date >= :since"
+)
+
+# Platform-wide numbers used as denominators
+PLATFORM_TOTALS_QUERY = text(
+    f"SELECT COUNT(*) AS total_rows FROM {REPORT_VIEW}"
+)
+
+
+def fetch_merchant_transactions(conn, merchant_id, start, end):
+    """
+    Loads the report columns of a single merchant for payments made
+    in the [start, end) window, conformed to the report schema.
+    """
+    transactions = pd.read_sql(
+        MERCHANT_WINDOW_QUERY,
+        conn,
+        params={"merchant_id": merchant_id, "start": start, "end": end},
+        parse_dates=["payment_date"]
+    )
+    return conform_report_frame(transactions)
+
+
+def iter_merchant_transactions(conn, merchant_id, start, end, chunk_rows):
+    """
+    Streams the rows fetch_merchant_transactions returns, as frames of at
+    most chunk_rows rows conformed to the report schema. The result set is
+    read through a server-side cursor, so only one chunk is held at a time.
+    """
+    chunks = pd.read_sql(
+        MERCHANT_WINDOW_QUERY,
+        conn.execution_options(stream_results=True),
+        params={"merchant_id": merchant_id, "start": start, "end": end},
+        parse_dates=["payment_date"],
+        chunksize=chunk_rows
+    )
+    for chunk in chunks:
+        yield conform_report_frame(chunk)
+
+
+def fetch_merchant_user_totals(conn, merchant_id):
+    """
+    Returns the number of distinct users the merchant ever had.
+    """
+    total_users = conn.execute(MERCHANT_USERS_QUERY, {"merchant_id": merchant_id}).scalar()
+    return int(total_users or 0)
+
+
+def fetch_merchant_state_distribution(conn, merchant_id, limit=TOP_STATES):
+    """
+    Returns the merchant's top states by user count as a Series
+    indexed by state.
+    """
+    states = pd.read_sql(
+        MERCHANT_STATES_QUERY,
+        conn,
+        params={"merchant_id": merchant_id, "limit": limit}
+    )
+    return states.set_index("state")["users"]
+
+
+def fetch_merchant_window_users(conn, merchant_id, start, end):
+    """
+    Returns the number of distinct users the merchant had in the [start, end) window.
+    """
+    window_users = conn.execute(
+        MERCHANT_WINDOW_USERS_QUERY, {"merchant_id": merchant_id, "start": start, "end": end}
+    ).scalar()
+    return int(window_users or 0)
+
+
+def fetch_merchant_returning_users(conn, merchant_id, start, end):
+    """
+    Returns how many of the merchant's users in the [start, end) window had
+    already paid before start.
+    """
+    returning_users = conn.execute(
+        MERCHANT_RETURNING_USERS_QUERY, {"merchant_id": merchant_id, "start": start, "end": end}
+    ).scalar()
+    return int(returning_users or 0)
+
+
+def fetch_rollup_source(conn, since):
+    """
+    Loads the rows of every merchant paid at or after since.
+    """
+    transactions = pd.read_sql(
+        ROLLUP_SOURCE_QUERY,
+        conn,
+        params={"since": since},
+        parse_dates=["payment_date"]
+    )
+    return conform_report_frame(transactions, ROLLUP_SCHEMA)
+
+
+def fetch_snapshot_source(conn, since):
+    """
+    Loads the report columns of every merchant paid at or after since,
+    conformed to the report schema.
+    """
+    transactions = pd.read_sql(
+        SNAPSHOT_SOURCE_QUERY,
+        conn,
+        params={"since": since},
+        parse_dates=["payment_date"]
+    )
+    return conform_report_frame(transactions)
+
+
+# Values too costly to query on every request, shared by the process:
+# name -> (value, expires), with one lock per name so concurrent misses run the query once
+_ttl_values = {}
+_ttl_locks = defaultdict(threading.Lock)
+_ttl_lock = threading.Lock()
+
+
+def _ttl_cached(name, ttl, compute):
+    with _ttl_lock:
+        lock = _ttl_locks[name]
+    with lock:
+        entry = _ttl_values.get(name)
+        if entry is not None and time.monotonic() < entry[1]:
+            return entry[0]
+        value = compute()
+        _ttl_values[name] = (value, time.monotonic() + ttl)
+        return value
+
+
+def _store_ttl_value(name, ttl, value):
+    with _ttl_lock:
+        lock = _ttl_locks[name]
+    with lock:
+        _ttl_values[name] = (value, time.monotonic() + ttl)
+
+
+def fetch_platform_totals(conn):
+    """
+    Returns the platform-wide aggregates the report compares a merchant
+    against, queried at most once every PLATFORM_TOTALS_TTL seconds.
+    """
+    def compute():
+        row = conn.execute(PLATFORM_TOTALS_QUERY).mappings().one()
+        return {"total_rows": int(row["total_rows"] or 0)}
+    return dict(_ttl_cached("platform_totals", PLATFORM_TOTALS_TTL, compute))
+
+
+def fetch_merchant_checksum(conn, merchant_id):
+    """
+    Returns the merchant's row checksum, reused for WATERMARK_CHECKSUM_TTL
+    seconds so requests do not scan its history each time.
+    """
+    def compute():
+        return int(conn.execute(MERCHANT_CHECKSUM_QUERY, {"merchant_id": merchant_id}).scalar() or 0)
+    return _ttl_cached(("checksum", str(merchant_id)), WATERMARK_CHECKSUM_TTL, compute)
+
+
+def fetch_merchant_watermark(conn, merchant_id):
+    """
+    Returns the merchant's latest payment_date and row count, both read
+    from the index, and its row checksum from fetch_merchant_checksum.
+    """
+    row = conn.execute(MERCHANT_WATERMARK_QUERY, {"merchant_id": merchant_id}).mappings().one()
+    return _watermark(row, fetch_merchant_checksum(conn, merchant_id))
+
+
+def _watermark(row, checksum):
+    last_payment = row["last_payment"]
+    if last_payment is not None:
+        last_payment = pd.Timestamp(last_payment).to_pydatetime()
+    return {
+        "last_payment": last_payment,
+        "row_count": int(row["row_count"] or 0),
+        "checksum": checksum
+    }
+
+
+def fetch_merchant_watermarks(conn):
+    """
+    Returns every merchant's watermark, in the form of fetch_merchant_watermark,
+    keyed by merchant_id. The checksums come from one grouped scan and
+    refresh the ones fetch_merchant_checksum reuses.
+    """
+    watermarks = {}
+    for row in conn.execute(ALL_MERCHANTS_WATERMARK_QUERY).mappings():
+        checksum = int(row["checksum"] or 0)
+        _store_ttl_value(("checksum", str(row["merchant_id"])), WATERMARK_CHECKSUM_TTL, checksum)
+        watermarks[row["merchant_id"]] = _watermark(row, checksum)
+    return watermarks
+
+
+def load_report_data(conn, merchant_id, start, end):
+    """
+    Runs every query a report needs on one connection.
+    """
+    return {
+        "transactions": fetch_merchant_transactions(conn, merchant_id, start, end),
+        "total_users": fetch_merchant_user_totals(conn, merchant_id),
+        "returning_users": fetch_merchant_returning_users(conn, merchant_id, start, end),
+        "user_state_dist": fetch_merchant_state_distribution(conn, merchant_id),
+        "platform_totals": fetch_platform_totals(conn)
+    }
+
+
+def load_batch_data(conn, start, end, merchant_ids=None):
+    """
+    Runs the queries of a multi-merchant batch once: every selected merchant's
+    rows in the window, plus per-merchant user totals, returning users and
+    state distributions grouped in SQL.
+    """
+    if merchant_ids:
+        transactions = pd.read_sql(
+            MERCHANTS_WINDOW_QUERY,
+            conn,
+            params={"merchant_ids": list(merchant_ids), "start": start, "end": end},
+            parse_dates=["payment_date"]
+        )
+    else:
+        transactions = pd.read_sql(
+            ALL_MERCHANTS_WINDOW_QUERY,
+            conn,
+            params={"start": start, "end": end},
+            parse_dates=["payment_date"]
+        )
+    transactions = conform_report_frame(transactions)
+    total_users = pd.read_sql(ALL_MERCHANTS_USERS_QUERY, conn)
+    states = pd.read_sql(ALL_MERCHANTS_STATES_QUERY, conn)
+    returning_users = pd.read_sql(ALL_MERCHANTS_RETURNING_USERS_QUERY, conn, params={"start": start, "end": end})
+    return {
+        "transactions": transactions,
+        "total_users": total_users.set_index("merchant_id")["total_users"].to_dict(),
+        "returning_users": returning_users.set_index("merchant_id")["returning_users"].to_dict(),
+        "user_state_dist": states.set_index(["merchant_id", "state"])["users"],
+        "platform_totals": fetch_platform_totals(conn)
+    }
@@ -0,0 +1,70 @@
+import pandas as pd
+
+# Money columns are held as whole cents, so sums are exact
+MONEY_COLUMNS = ["paid_amount", "fee", "commission_amount"]
+MONEY_SCALE = 100
+
+# dtypes of the report frame, in the order of config.REPORT_COLUMNS
+REPORT_SCHEMA = {
+    "merchant_id": "int32",
+    "paid_amount": "Int64",
+    "fee": "Int64",
+    "commission_amount": "Int64",
+    "status": "category",
+    "payment_date": "datetime64[ns]",
+    "user_id": "Int32",
+    "state": "category"
+}
+
+
+class SchemaError(ValueError):
+    """Raised when a loaded frame cannot be brought to the report schema."""
+
+
+def to_cents(values):
+    """
+    Converts money amounts to nullable whole cents.
+    """
+    return (pd.to_numeric(values) * MONEY_SCALE).round().astype("Int64")
+
+
+def to_amount(cents):
+    """
+    Converts cents (a Series or a scalar sum) back to float amounts.
+    """
+    if isinstance(cents, pd.Series):
+        return cents.astype("float64") / MONEY_SCALE
+    return float(cents) / MONEY_SCALE if not pd.isna(cents) else 0.0
+
+
+def _convert(series, dtype):
+    if dtype == "datetime64[ns]":
+        return pd.to_datetime(series)
+    if series.name in MONEY_COLUMNS:
+        return to_cents(series)
+    return series.astype(dtype)
+
+
+def conform_report_frame(df, schema=REPORT_SCHEMA):
+    """
+    Brings a frame loaded from the report view (or a CSV export of it) to
+    the report schema. Only the schema's columns are kept, and columns that
+    already have the schema's dtype are left as they are, so conforming an
+    already conformed frame costs nothing.
+    Raises SchemaError when a column is missing or cannot be converted.
+    """
+    missing = [column for column in schema if column not in df.columns]
+    if missing:
+        raise SchemaError(f"Report frame is missing columns: {', '.join(missing)}")
+
+    columns = {}
+    for column, dtype in schema.items():
+        series = df[column]
+        if series.dtype == dtype:
+            columns[column] = series
+            continue
+        try:
+            columns[column] = _convert(series, dtype)
+        except (TypeError, ValueError) as exc:
+            raise SchemaError(f"Column {column} cannot be read as {dtype}: {exc}") from exc
+    return pd.DataFrame(columns, index=df.index)
@@ -1,3 +1,4 @@
-from .final_pipeline import run_pipeline
+from .final_pipeline import run_pipeline, run_pipeline_async
+from .metrics import ReportMetrics, compute_metrics, metrics_from_frame
 
-__all__ = ["run_pipeline"]
\ No newline at end of file
+__all__ = ["run_pipeline", "run_pipeline_async", "ReportMetrics", "compute_metrics", "metrics_from_frame"]
\ No newline at end of file
@@ -0,0 +1,150 @@
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+import asyncio
+import math
+import os
+import sys
+import time
+
+# Add the root directory to sys.path
+root_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(root_path)
+from pipeline.instrumentation import ADMISSION_IN_USE, ADMISSION_QUEUE_DEPTH, ADMISSION_WAIT, ADMISSION_REJECTED
+
+
+class AdmissionRejected(Exception):
+    """Raised when a report is not admitted: 429 when the wait queue is full, 503 after waiting too long."""
+
+    def __init__(self, message, status_code, retry_after):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """
+    Cost-weighted limit on the reports generated at the same time.
+    Each report takes cost units out of capacity, e.g. one unit per
+    rows_per_unit rows of the merchant, and reports that do not fit wait
+    in a FIFO queue of at most max_queue entries for up to timeout seconds.
+    Requests take capacity with admit(), background work (report jobs,
+    pre-builds) with hold() from its worker threads, so both share one limit.
+    The controller lives on one event loop, set with bind().
+    """
+
+    def __init__(self, capacity=4, max_queue=32, timeout=30, rows_per_unit=100000, retry_after=30):
+        self.capacity = capacity
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.rows_per_unit = rows_per_unit
+        self.retry_after = retry_after
+        self.in_use = 0
+        self._waiters = deque()
+        self._loop = None
+
+    def bind(self, loop):
+        """
+        Sets the event loop the controller runs on, for hold().
+        """
+        self._loop = loop
+
+    def cost(self, rows):
+        """
+        Estimated cost of a report over rows rows, between 1 and capacity.
+        """
+        return min(max(math.ceil((rows or 0) / self.rows_per_unit), 1), self.capacity)
+
+    def depth(self):
+        return len(self._waiters)
+
+    @asynccontextmanager
+    async def admit(self, cost=1):
+        """
+        Holds cost units while the block runs, waiting for them if needed.
+        Raises AdmissionRejected when the queue is full or the wait times out.
+        """
+        cost = await self._acquire(cost, self.timeout, bounded=True)
+        try:
+            yield
+        finally:
+            self._release(cost)
+
+    @contextmanager
+    def hold(self, cost=1):
+        """
+        Blocking counterpart of admit() for worker threads (never the loop's
+        own thread). Background work waits in the same FIFO queue, but
+        without a timeout or queue limit, as it has nobody to answer 429 to.
+        Without a bound loop, e.g. in a CLI run, nothing is held.
+        """
+        loop = self._loop
+        if loop is None:
+            yield
+            return
+        cost = asyncio.run_coroutine_threadsafe(self._acquire(cost, None, bounded=False), loop).result()
+        try:
+            yield
+        finally:
+            loop.call_soon_threadsafe(self._release, cost)
+
+    async def _acquire(self, cost, timeout, bounded):
+        cost = min(max(cost, 1), self.capacity)
+        started = time.perf_counter()
+        if not self._waiters and self.in_use + cost <= self.capacity:
+            self._take(cost)
+        else:
+            await self._wait(cost, timeout, bounded)
+        ADMISSION_WAIT.observe(time.perf_counter() - started)
+        return cost
+
+    async def _wait(self, cost, timeout, bounded):
+        if bounded and len(self._waiters) >= self.max_queue:
+            ADMISSION_REJECTED.labels(reason="queue_full").inc()
+            raise AdmissionRejected(
+                f"Too many reports waiting ({self.max_queue}), try again later.", 429, self.retry_after
+            )
+        future = asyncio.get_running_loop().create_future()
+        entry = (cost, future)
+        self._waiters.append(entry)
+        ADMISSION_QUEUE_DEPTH.set(len(self._waiters))
+        try:
+            await asyncio.wait_for(future, timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as exc:
+            if future.done() and not future.cancelled():
+                # The units were granted just as the wait ended, hand them back
+                self._release(cost)
+            else:
+                # Another waiter's wake-up may already have dropped the entry
+                if entry in self._waiters:
+                    self._waiters.remove(entry)
+                ADMISSION_QUEUE_DEPTH.set(len(self._waiters))
+                self._wake()
+            if isinstance(exc, asyncio.TimeoutError):
+                ADMISSION_REJECTED.labels(reason="timeout").inc()
+                raise AdmissionRejected(
+                    f"No capacity for the report within {timeout}s, try again later.", 503, self.retry_after
+                ) from None
+            raise
+
+    def _take(self, cost):
+        self.in_use += cost
+        ADMISSION_IN_USE.set(self.in_use)
+
+    def _release(self, cost):
+        self.in_use -= cost
+        ADMISSION_IN_USE.set(self.in_use)
+        self._wake()
+
+    def _wake(self):
+        # Grant waiting reports in arrival order while the oldest one fits
+        while self._waiters:
+            cost, future = self._waiters[0]
+            if future.done():
+                self._waiters.popleft()
+                continue
+            if self.in_use + cost > self.capacity:
+                break
+            self._waiters.popleft()
+            self._take(cost)
+            future.set_result(None)
+        ADMISSION_QUEUE_DEPTH.set(len(self._waiters))
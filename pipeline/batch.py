@@ -0,0 +1,154 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date, datetime
+import argparse
+import hashlib
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+# Add the root directory to sys.path
+root_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(root_path)
+from pipeline.pages import REPORT_PAGES, render_page_timed
+from pipeline.create_pdf import PDF_PROFILES, assemble_pdf, get_profile
+from pipeline.instrumentation import record_stage
+from pipeline.metrics import compute_metrics_bulk
+from pipeline.windows import resolve_window
+from pipeline.snapshot import get_snapshot
+from database.engine import get_engine
+from database.queries import load_batch_data
+from config import PDF_BACKEND, PDF_PROFILE, RENDER_WORKERS, TOP_STATES, METRICS_SOURCE
+
+
+def _render_merchant(metrics, backend, profile):
+    # Runs in a render worker, returns the PDF, how long it took and each
+    # page's render time, which the parent records
+    started = time.perf_counter()
+    pages, page_seconds = [], []
+    for index, (name, _, section, _) in enumerate(REPORT_PAGES):
+        page, seconds = render_page_timed(index, getattr(metrics, section), backend, profile)
+        pages.append(page)
+        page_seconds.append((name, seconds))
+    pdf = assemble_pdf(pages, backend, profile=profile)
+    return pdf, time.perf_counter() - started, page_seconds
+
+
+def run_batch(output_dir, merchant_ids=None, backend=PDF_BACKEND, workers=RENDER_WORKERS,
+              start=None, end=None, period=None, profile=None):
+    """
+    Generates the reports of many merchants from a single data pass.
+    The report data is loaded once, all merchants' metrics come from one
+    grouped computation, and the PDFs are rendered in parallel.
+    Each report is written to <output_dir>/<merchant_id>/merchant_report.pdf
+    and the run is described in <output_dir>/manifest.json.
+    start, end and period select the window, and profile the output
+    profile, as in run_pipeline.
+    Returns the manifest.
+    """
+    started = time.perf_counter()
+    window = resolve_window(start, end, period)
+    start, end = window.start, window.end
+    profile = get_profile(profile).name
+
+    # One scan of the view (or of the local snapshot) for every merchant
+    if METRICS_SOURCE == "snapshot":
+        data = get_snapshot().load_batch_data(start, end, merchant_ids)
+    else:
+        with get_engine().connect() as conn:
+            data = load_batch_data(conn, start, end, merchant_ids)
+    loaded = time.perf_counter()
+    print(f"Loaded {len(data['transactions'])} rows in {loaded - started:.2f}s")
+
+    # Ids given on the command line are strings, match them to the view's ids
+    if merchant_ids:
+        known_ids = {str(merchant_id): merchant_id for merchant_id in data["total_users"]}
+        merchant_ids = [known_ids.get(str(merchant_id), merchant_id) for merchant_id in merchant_ids]
+
+    all_metrics = compute_metrics_bulk(
+        data["transactions"],
+        start,
+        end,
+        total_users=data["total_users"],
+        returning_users=data["returning_users"],
+        total_platform_users=data["platform_totals"]["total_rows"],
+        user_state_dist=data["user_state_dist"],
+        merchant_ids=merchant_ids,
+        top_states=TOP_STATES,
+        window_title=window.title
+    )
+    computed = time.perf_counter()
+    print(f"Computed metrics for {len(all_metrics)} merchants in {computed - loaded:.2f}s")
+
+    os.makedirs(output_dir, exist_ok=True)
+    reports = []
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        futures = {
+            pool.submit(_render_merchant, metrics, backend, profile): merchant_id
+            for merchant_id, metrics in all_metrics.items()
+        }
+        for future in as_completed(futures):
+            merchant_id = futures[future]
+            entry = {"merchant_id": str(merchant_id)}
+            try:
+                pdf, render_seconds, page_seconds = future.result()
+            except Exception as exc:
+                entry.update(status="failed", error=str(exc))
+                print(f"Report for merchant {merchant_id} failed: {exc}")
+            else:
+                for name, seconds in page_seconds:
+                    record_stage(f"render:{name}", seconds, backend=backend, profile=profile,
+                                 merchant_id=merchant_id)
+                merchant_dir = os.path.join(output_dir, str(merchant_id))
+                os.makedirs(merchant_dir, exist_ok=True)
+                pdf_path = os.path.join(merchant_dir, "merchant_report.pdf")
+                with open(pdf_path, "wb") as f:
+                    f.write(pdf)
+                entry.update(
+                    status="done",
+                    path=os.path.relpath(pdf_path, output_dir),
+                    bytes=len(pdf),
+                    sha256=hashlib.sha256(pdf).hexdigest(),
+                    render_seconds=round(render_seconds, 3)
+                )
+            reports.append(entry)
+
+    manifest = {
+        "generated_at": datetime.now().isoformat(),
+        "window": {"start": start.isoformat(), "end": end.isoformat(), "title": window.title},
+        "backend": backend,
+        "profile": profile,
+        "rows": len(data["transactions"]),
+        "seconds": {
+            "load": round(loaded - started, 3),
+            "metrics": round(computed - loaded, 3),
+            "total": round(time.perf_counter() - started, 3)
+        },
+        "reports": sorted(reports, key=lambda entry: entry["merchant_id"])
+    }
+    with open(os.path.join(output_dir, "manifest.json"), "w") as f:
+        json.dump(manifest, f, indent=2)
+    print(f"Batch finished in {manifest['seconds']['total']:.2f}s, manifest written to {output_dir}")
+    return manifest
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate merchant reports in bulk.")
+    parser.add_argument("--output-dir", required=True, help="Directory the reports and manifest are written to")
+    parser.add_argument("--merchant-id", action="append", dest="merchant_ids",
+                        help="Merchant to include, can be repeated (default: every merchant with payments in the window)")
+    parser.add_argument("--backend", default=PDF_BACKEND, choices=["vector", "raster"])
+    parser.add_argument("--profile", default=PDF_PROFILE, choices=list(PDF_PROFILES))
+    parser.add_argument("--workers", type=int, default=RENDER_WORKERS)
+    parser.add_argument("--start", type=date.fromisoformat, help="First day of the window (YYYY-MM-DD)")
+    parser.add_argument("--end", type=date.fromisoformat, help="Last day of the window (YYYY-MM-DD)")
+    parser.add_argument("--period", help='Named period: "month", "quarter", "year" or e.g. "2025Q1"')
+    args = parser.parse_args(argv)
+    manifest = run_batch(args.output_dir, args.merchant_ids, args.backend, args.workers,
+                         args.start, args.end, args.period, args.profile)
+    failed = [entry for entry in manifest["reports"] if entry["status"] != "done"]
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,26 +1,257 @@
+from dataclasses import dataclass
 from PIL import Image
+from pypdf import PageObject, PdfReader, PdfWriter
+from pypdf.generic import ArrayObject, ByteStringObject, DecodedStreamObject, DictionaryObject, NameObject, NumberObject
+import io
 import sys
 import os
+import threading
 # Add the root directory to sys.path
 root_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
 sys.path.append(root_path)
-from config import IMAGE_PATHS, PDF_PATH
+from config import IMAGE_PATHS, PDF_PATH, PDF_PROFILE
 
 
-def save_images_to_pdf(image_paths, pdf_path):
+@dataclass(frozen=True)
+class OutputProfile:
+    """
+    How a report is written: page resolution, colours of raster pages (a
+    palette of colors entries, or full RGB when None), zlib level of the
+    page streams and images, and the size the report of a busy merchant
+    should stay under.
+    Vector text uses the PDF base-14 fonts when core_fonts is set (nothing
+    embedded, Latin text only), otherwise fonts of fonttype (42 embeds
+    subset TrueType fonts, 3 draws glyphs as Type 3 procedures). Vector
+    lines and collections of more than rasterize_above points are drawn
+    as images at the profile's dpi.
+    """
+    name: str
+    dpi: int
+    colors: int = None
+    compression: int = 9
+    fonttype: int = 42
+    core_fonts: bool = False
+    rasterize_above: int = None
+    max_bytes: int = None
+
+
+# Selectable with ?profile= on /report/ and --profile in the batch CLI.
+# Charts are mostly flat colour, so palette pages compress far better than
+# JPEG and stay sharp. Base-14 fonts make the vector report about a fifth
+# of its size with embedded fonts.
+PDF_PROFILES = {
+    "screen": OutputProfile("screen", dpi=100, colors=64, core_fonts=True, rasterize_above=2000,
+                            max_bytes=250000),
+    "print": OutputProfile("print", dpi=200, colors=256, rasterize_above=20000, max_bytes=600000),
+    "archive": OutputProfile("archive", dpi=300, max_bytes=2000000)
+}
+
+# rcParams are global, so profile settings are applied to one savefig at a time
+_rc_lock = threading.Lock()
+
+
+def get_profile(profile=None):
+    """
+    Returns the OutputProfile named profile (PDF_PROFILE when None).
+    Raises ValueError for an unknown name.
+    """
+    if isinstance(profile, OutputProfile):
+        return profile
+    name = profile or PDF_PROFILE
+    if name not in PDF_PROFILES:
+        raise ValueError(f"Unknown PDF profile: {name} (expected one of {', '.join(PDF_PROFILES)})")
+    return PDF_PROFILES[name]
+
+
+def output_variant(backend, profile=None):
+    """
+    Names the output a backend and profile produce, for cache keys.
+    """
+    return f"{backend}:{get_profile(profile).name}"
+
+
+def figure_to_png(fig, dpi=300, colors=None, **savefig_kwargs):
+    """
+    Renders a matplotlib figure into PNG bytes held in memory, reduced to
+    a palette of colors entries when colors is given.
+    """
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format="png", dpi=dpi, **savefig_kwargs)
+    if not colors:
+        return buffer.getvalue()
+    image = Image.open(buffer).convert("RGB").quantize(colors)
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG", optimize=True)
+    return buffer.getvalue()
+
+
+def figure_to_pdf(fig, **savefig_kwargs):
+    """
+    Writes a matplotlib figure as a single-page vector PDF held in memory.
+    """
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format="pdf", **savefig_kwargs)
+    return buffer.getvalue()
+
+
+def render_figure(fig, backend="vector", profile=None, **savefig_kwargs):
+    """
+    Renders a figure into one page of the given backend, with the output
+    profile: single-page PDF bytes with its fonts, compression and
+    rasterized dense artists for "vector", PNG bytes with its resolution
+    and colours for "raster".
+    """
+    import matplotlib
+
+    profile = get_profile(profile)
+    if backend == "vector":
+        _rasterize_dense(fig, profile.rasterize_above)
+        with _rc_lock, matplotlib.rc_context(_vector_rc(profile)):
+            return figure_to_pdf(fig, dpi=profile.dpi, **savefig_kwargs)
+    if backend == "raster":
+        return figure_to_png(fig, dpi=profile.dpi, colors=profile.colors, **savefig_kwargs)
+    raise ValueError(f"Unknown PDF backend: {backend}")
+
+
+def _vector_rc(profile):
+    import matplotlib
+
+    rc = {"pdf.fonttype": profile.fonttype, "pdf.compression": profile.compression}
+    if profile.core_fonts:
+        # Helvetica first, so sans-serif text finds its base-14 metrics
+        rc["pdf.use14corefonts"] = True
+        rc["font.sans-serif"] = ["Helvetica"] + matplotlib.rcParams["font.sans-serif"]
+    return rc
+
+
+def _rasterize_dense(fig, limit):
+    # Lines and collections with more than limit points become images
+    if limit is None:
+        return
+    for ax in fig.axes:
+        for artist in ax.lines:
+            if len(artist.get_xydata()) > limit:
+                artist.set_rasterized(True)
+        for artist in ax.collections:
+            if max(len(artist.get_offsets()), len(artist.get_paths())) > limit:
+                artist.set_rasterized(True)
+
+
+def merge_pdf_pages(pages, pdf_path=None):
+    """
+    Concatenates single-page PDFs into one document and returns its bytes.
+    The PDF is also written to pdf_path when one is given.
+    """
+    writer = PdfWriter()
+    for page in pages:
+        writer.append(PdfReader(io.BytesIO(page)))
+    buffer = io.BytesIO()
+    writer.write(buffer)
+    pdf = buffer.getvalue()
+    if pdf_path:
+        with open(pdf_path, "wb") as f:
+            f.write(pdf)
+        print(f"PDF saved successfully to {pdf_path}.")
+    return pdf
+
+
+def assemble_pdf(pages, backend="vector", pdf_path=None, profile=None):
+    """
+    Builds the report PDF from pages rendered with render_figure, using
+    the same output profile.
+    """
+    if backend == "vector":
+        return merge_pdf_pages(pages, pdf_path)
+    if backend == "raster":
+        return images_to_pdf(pages, get_profile(profile), pdf_path)
+    raise ValueError(f"Unknown PDF backend: {backend}")
+
+
+def _image_xobject(image, profile):
+    # Page image as a Flate-compressed XObject, palette pages as indexed colours
+    xobject = DecodedStreamObject()
+    xobject.update({
+        NameObject("/Type"): NameObject("/XObject"),
+        NameObject("/Subtype"): NameObject("/Image"),
+        NameObject("/Width"): NumberObject(image.width),
+        NameObject("/Height"): NumberObject(image.height),
+        NameObject("/BitsPerComponent"): NumberObject(8)
+    })
+    if image.mode == "P":
+        palette = image.getpalette()[:3 * (image.getextrema()[1] + 1)]
+        xobject[NameObject("/ColorSpace")] = ArrayObject([
+            NameObject("/Indexed"), NameObject("/DeviceRGB"),
+            NumberObject(len(palette) // 3 - 1), ByteStringObject(bytes(palette))
+        ])
+    else:
+        image = image.convert("RGB")
+        xobject[NameObject("/ColorSpace")] = NameObject("/DeviceRGB")
+    xobject.set_data(image.tobytes())
+    return xobject.flate_encode(profile.compression)
+
+
+def images_to_pdf(images, profile, pdf_path=None):
+    """
+    Assembles PNG page images into a PDF and returns its bytes. Each page
+    is sized to its image at the profile's dpi, so A4 figures give A4 pages.
+    The PDF is also written to pdf_path when one is given.
+    """
+    writer = PdfWriter()
+    for image in images:
+        image = Image.open(io.BytesIO(image))
+        if image.mode not in ("P", "RGB"):
+            image = image.convert("RGB")
+        width, height = image.width * 72 / profile.dpi, image.height * 72 / profile.dpi
+
+        page = PageObject.create_blank_page(width=width, height=height)
+        xobject = writer._add_object(_image_xobject(image, profile))
+        page[NameObject("/Resources")] = DictionaryObject({
+            NameObject("/XObject"): DictionaryObject({NameObject("/Page"): xobject})
+        })
+        content = DecodedStreamObject()
+        content.set_data(f"q {width:.4f} 0 0 {height:.4f} 0 0 cm /Page Do Q".encode("ascii"))
+        page[NameObject("/Contents")] = writer._add_object(content.flate_encode(profile.compression))
+        writer.add_page(page)
+
+    buffer = io.BytesIO()
+    writer.write(buffer)
+    pdf = buffer.getvalue()
+    if pdf_path:
+        with open(pdf_path, "wb") as f:
+            f.write(pdf)
+        print(f"PDF saved successfully to {pdf_path}.")
+    return pdf
+
+
+def save_images_to_pdf(images, pdf_path=None):
+    """
+    Assembles the page images into a PDF and returns its bytes.
+    images may be file paths or PNG bytes. The PDF is also written to
+    pdf_path when one is given.
+    """
     # Load and convert all images
-    pages = [Image.open(p).convert("RGB") for p in image_paths]
+    pages = [
+        Image.open(io.BytesIO(image) if isinstance(image, bytes) else image).convert("RGB")
+        for image in images
+    ]
 
     if pages:
-        # Overwrite the PDF with new images
+        buffer = io.BytesIO()
         pages[0].save(
-            pdf_path,
+            buffer,
+            format="PDF",
             save_all=True,
             append_images=pages[1:]
         )
-        print(f"PDF saved successfully to {pdf_path}.")
+        pdf = buffer.getvalue()
+        if pdf_path:
+            with open(pdf_path, "wb") as f:
+                f.write(pdf)
+            print(f"PDF saved successfully to {pdf_path}.")
+        return pdf
     else:
         print("No images to save.")
+        return b""
 
 if __name__ == "__main__":
     # Run the function
@@ -4,50 +4,250 @@ import os
 root_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
 sys.path.append(root_path)
 
-from pipeline.total_amount import total_amount_calc
-from pipeline.total_count import total_count_calc
-from pipeline.status_analysis import transaction_status_analysis
-from pipeline.user_analysis import user_analysis_metrics
-from pipeline.user_distriution import user_state_distribution
-from pipeline.create_pdf import save_images_to_pdf
-from config import IMAGE_PATHS, PDF_PATH
-from config import DB_URL
-import pandas as pd
-from sqlalchemy import create_engine
-
-
-def run_pipeline(merchant_id):
-    # Connect and query
-    engine = create_engine(DB_URL)
-    merged_df = pd.read_sql("SELECT * FROM `reporting-db`.v3_full_report", engine)
-    df = merged_df.copy()
-    
-    # Calculate total amount
-    total_amount = total_amount_calc(merged_df, merchant_id)
-    print(f"Total Amount: {total_amount}")
-
-    # Calculate total count
-    total_count = total_count_calc(merged_df, merchant_id)
-    print(f"Total Count: {total_count}")
-
-    # Analyze transaction status
-    status_analysis = transaction_status_analysis(merged_df, merchant_id)
-    print("Transaction Status Analysis:")
-    print(status_analysis)
-
-    # Analyze user metrics
-    user_metrics = user_analysis_metrics(df, merged_df, merchant_id)
-    print("User Analysis Metrics:")
-    print(user_metrics)
-
-    # Analyze user state distribution
-    user_distribution = user_state_distribution(merged_df, merchant_id)
-    print("User State Distribution:")
-    print(user_distribution)
-
-    # Save all images to PDF
-    save_images_to_pdf(IMAGE_PATHS, PDF_PATH)
+from pipeline.pages import render_pages
+from pipeline.parallel import render_pages_parallel
+from pipeline.page_cache import render_pages_cached
+from pipeline.create_pdf import assemble_pdf, get_profile
+from pipeline.metrics import compute_metrics, build_metrics, MetricsAccumulator
+from pipeline.rollups import get_rollup_store
+from pipeline.snapshot import get_snapshot
+from pipeline.instrumentation import stage, trace, LOADED_ROWS, REPORT_BYTES
+from pipeline.windows import resolve_window
+from database.engine import get_engine
+from database.queries import (
+    load_report_data,
+    iter_merchant_transactions,
+    fetch_merchant_watermark,
+    fetch_merchant_user_totals,
+    fetch_merchant_returning_users,
+    fetch_merchant_state_distribution,
+    fetch_platform_totals
+)
+from config import TOP_STATES, PDF_BACKEND, RENDER_MODE, METRICS_SOURCE, STREAM_CHUNK_ROWS
+import asyncio
+
+
+def load_rollup_report_data(conn, merchant_id, start, end):
+    """
+    Rollup-based counterpart of load_report_data: the daily series, status
+    counts, totals and distinct-user counts (from the daily user sketches
+    and first-seen days) come from the local rollup store, and only the state
+    distribution and platform numbers are queried.
+    """
+    store = get_rollup_store()
+    daily, status_counts, totals = store.load(merchant_id, start, end)
+    users = store.load_user_counts(merchant_id, start, end)
+    return {
+        "daily": daily,
+        "status_counts": status_counts,
+        "totals": totals,
+        "window_users": users["window_users"],
+        "returning_users": users["returning_users"],
+        "total_users": users["total_users"],
+        "user_state_dist": fetch_merchant_state_distribution(conn, merchant_id),
+        "platform_totals": fetch_platform_totals(conn)
+    }
+
+
+def load_streamed_report_data(conn, merchant_id, start, end, chunk_rows=STREAM_CHUNK_ROWS):
+    """
+    Streaming counterpart of load_report_data: the window's rows are read
+    chunk_rows at a time and folded into a MetricsAccumulator, so no more
+    than one chunk is in memory whatever the merchant's size.
+    """
+    accumulator = MetricsAccumulator()
+    for chunk in iter_merchant_transactions(conn, merchant_id, start, end, chunk_rows):
+        accumulator.add(chunk)
+    return {
+        "accumulator": accumulator,
+        "total_users": fetch_merchant_user_totals(conn, merchant_id),
+        "returning_users": fetch_merchant_returning_users(conn, merchant_id, start, end),
+        "user_state_dist": fetch_merchant_state_distribution(conn, merchant_id),
+        "platform_totals": fetch_platform_totals(conn)
+    }
+
+
+def _load_data(conn, merchant_id, start, end):
+    # Read from the source selected by METRICS_SOURCE
+    if METRICS_SOURCE == "snapshot":
+        return get_snapshot().load_report_data(merchant_id, start, end)
+    if METRICS_SOURCE == "rollups":
+        return load_rollup_report_data(conn, merchant_id, start, end)
+    if STREAM_CHUNK_ROWS:
+        return load_streamed_report_data(conn, merchant_id, start, end)
+    return load_report_data(conn, merchant_id, start, end)
+
+
+def load_data(conn, merchant_id, start, end):
+    """
+    Loads the report data from the source selected by METRICS_SOURCE,
+    recording the load time and the number of rows (days for rollups) read.
+    """
+    with stage("load", source=METRICS_SOURCE, merchant_id=merchant_id) as details:
+        data = _load_data(conn, merchant_id, start, end)
+        if "accumulator" in data:
+            details["rows"] = data["accumulator"].rows
+        else:
+            details["rows"] = len(data["transactions"]) if "transactions" in data else len(data["daily"])
+    LOADED_ROWS.labels(source=METRICS_SOURCE).observe(details["rows"])
+    return data
+
+
+def report_metrics(data, merchant_id, window):
+    """
+    Computes every page's metrics for the ReportWindow from data loaded by load_data.
+    """
+    with stage("metrics"):
+        return _report_metrics(data, merchant_id, window)
+
+
+def _report_metrics(data, merchant_id, window):
+    if "accumulator" in data:
+        return data["accumulator"].to_metrics(
+            merchant_id,
+            window.start,
+            window.end,
+            total_users=data["total_users"],
+            total_platform_users=data["platform_totals"]["total_rows"],
+            user_state_dist=data["user_state_dist"],
+            top_states=TOP_STATES,
+            window_title=window.title,
+            returning_users=data["returning_users"]
+        )
+    if "transactions" in data:
+        return compute_metrics(
+            data["transactions"],
+            merchant_id,
+            window.start,
+            window.end,
+            total_users=data["total_users"],
+            total_platform_users=data["platform_totals"]["total_rows"],
+            user_state_dist=data["user_state_dist"],
+            top_states=TOP_STATES,
+            window_title=window.title,
+            returning_users=data["returning_users"]
+        )
+    return build_metrics(
+        merchant_id,
+        window.start,
+        window.end,
+        data["daily"],
+        status_counts=data["status_counts"],
+        paid_amount=data["totals"]["paid_amount"],
+        fee=data["totals"]["fee"],
+        commission_amount=data["totals"]["commission_amount"],
+        window_users=data["window_users"],
+        total_users=data["total_users"],
+        total_platform_users=data["platform_totals"]["total_rows"],
+        user_state_dist=data["user_state_dist"],
+        top_states=TOP_STATES,
+        window_title=window.title,
+        returning_users=data["returning_users"]
+    )
+
+
+def build_report(data, merchant_id, window, backend=PDF_BACKEND, profile=None):
+    """
+    Computes the metrics from the loaded report data and returns the
+    report PDF, written with the output profile (PDF_PROFILE when None),
+    as bytes. Nothing is written to disk.
+    """
+    # Compute every page's metrics in one pass
+    metrics = report_metrics(data, merchant_id, window)
+    status_counts = {str(status): int(count) for status, count in metrics.status.status_counts.items()}
+    trace("metrics_summary", merchant_id=merchant_id, total_paid=metrics.amount.total_paid,
+          total_count=metrics.count.total_count, status_counts=status_counts,
+          window_users=metrics.users.window_users)
+
+    # Draw the pages and assemble them into a PDF in memory
+    profile = get_profile(profile).name
+    # Pages whose metrics did not change since they were last drawn come from the page cache
+    with stage("render", mode=RENDER_MODE, backend=backend, profile=profile) as details:
+        render = render_pages_parallel if RENDER_MODE == "parallel" else render_pages
+        pages, details["cached_pages"] = render_pages_cached(metrics, backend, profile, render)
+    with stage("assemble", backend=backend, profile=profile) as details:
+        pdf = assemble_pdf(pages, backend, profile=profile)
+        details["bytes"] = len(pdf)
+    REPORT_BYTES.labels(backend=backend, profile=profile).observe(len(pdf))
+    return pdf
+
+
+def fetch_watermark(merchant_id):
+    """
+    Fetches the merchant's data watermark on the pooled engine.
+    Reports read from the snapshot change only when it is refreshed, so
+    its watermark is used instead. Reports read from the rollups also
+    carry the rollup store's watermark, so a report built before the
+    rollups caught up is not kept under the newer data's key.
+    """
+    if METRICS_SOURCE == "snapshot":
+        return {"snapshot": get_snapshot().watermark()}
+    with stage("watermark"):
+        with get_engine().connect() as conn:
+            watermark = fetch_merchant_watermark(conn, merchant_id)
+    if METRICS_SOURCE == "rollups":
+        watermark["rollups"] = get_rollup_store().watermark()
+    return watermark
+
+
+async def fetch_watermark_async(merchant_id):
+    """
+    Same as fetch_watermark, in a worker thread.
+    """
+    return await asyncio.to_thread(fetch_watermark, merchant_id)
+
+
+def run_pipeline(merchant_id, backend=PDF_BACKEND, start=None, end=None, period=None, profile=None):
+    """
+    Builds one merchant's report PDF. The window is the last 30 days unless
+    start/end dates or a period ("month", "quarter", "year", "2025Q1", ...)
+    are given, see pipeline.windows.resolve_window. profile names the
+    output profile ("screen", "print", "archive"), PDF_PROFILE by default.
+    """
+    # Query only this merchant's rows in the reporting window, plus the aggregates
+    window = resolve_window(start, end, period)
+    if METRICS_SOURCE == "snapshot":
+        # Local partitions only, no database round-trip
+        data = load_data(None, merchant_id, window.start, window.end)
+    else:
+        data = _load_data_sync(merchant_id, window.start, window.end)
+    return build_report(data, merchant_id, window, backend, profile)
+
+
+def _load_data_sync(merchant_id, start, end):
+    with get_engine().connect() as conn:
+        return load_data(conn, merchant_id, start, end)
+
+
+async def load_data_async(merchant_id, start, end):
+    """
+    Loads the report data in a worker thread, so the event loop keeps
+    serving other requests. Transactions and rollups are read on the
+    pooled engine, the snapshot from its local partitions.
+    """
+    if METRICS_SOURCE == "snapshot":
+        return await asyncio.to_thread(load_data, None, merchant_id, start, end)
+    return await asyncio.to_thread(_load_data_sync, merchant_id, start, end)
+
+
+async def run_pipeline_async(merchant_id, backend=PDF_BACKEND, start=None, end=None, period=None, profile=None):
+    """
+    Same as run_pipeline, but awaitable: loading, metrics and rendering
+    all run in worker threads, never on the event loop.
+    """
+    window = resolve_window(start, end, period)
+    data = await load_data_async(merchant_id, window.start, window.end)
+    return await asyncio.to_thread(build_report, data, merchant_id, window, backend, profile)
+
+async def run_metrics_async(merchant_id, start=None, end=None, period=None):
+    """
+    Loads the report data and computes the metrics without rendering anything.
+    """
+    window = resolve_window(start, end, period)
+    data = await load_data_async(merchant_id, window.start, window.end)
+    return await asyncio.to_thread(report_metrics, data, merchant_id, window)
 
 if __name__ == "__main__":
-    run_pipeline(merchent_id=3)
+    with open("artifacts/merchant_report.pdf", "wb") as f:
+        f.write(run_pipeline(merchant_id=3))
     print("Pipeline execution completed successfully.")
\ No newline at end of file
@@ -0,0 +1,107 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+import json
+import logging
+import os
+import sys
+import time
+from prometheus_client import Counter, Gauge, Histogram
+
+# Add the root directory to sys.path
+root_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(root_path)
+from config import REPORT_TRACE_LOGS
+
+STAGE_SECONDS = Histogram(
+    "report_stage_seconds",
+    "Time spent in each report stage.",
+    ["stage"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+)
+LOADED_ROWS = Histogram(
+    "report_loaded_rows",
+    "Rows loaded for one report, by data source.",
+    ["source"],
+    buckets=(10, 100, 1000, 10000, 100000, 1000000, 10000000)
+)
+REPORT_BYTES = Histogram(
+    "report_output_bytes",
+    "Size of the returned reports.",
+    ["backend", "profile"],
+    buckets=(50000, 100000, 250000, 500000, 1000000, 2500000, 5000000, 10000000)
+)
+CACHE_LOOKUPS = Counter(
+    "report_cache_lookups_total",
+    "Report cache lookups by result (hit, miss, not_modified).",
+    ["result"]
+)
+COALESCED_REQUESTS = Counter(
+    "report_coalesced_requests_total",
+    "Requests served by joining an identical in-flight generation.",
+    ["endpoint"]
+)
+PAGE_CACHE_LOOKUPS = Counter(
+    "report_page_cache_lookups_total",
+    "Rendered page cache lookups by page and result (hit, miss).",
+    ["page", "result"]
+)
+ADMISSION_IN_USE = Gauge(
+    "report_admission_units_in_use",
+    "Cost units held by reports being generated."
+)
+ADMISSION_QUEUE_DEPTH = Gauge(
+    "report_admission_queue_depth",
+    "Reports waiting for capacity."
+)
+ADMISSION_WAIT = Histogram(
+    "report_admission_wait_seconds",
+    "Time admitted reports waited for capacity.",
+    buckets=(0.001, 0.01, 0.1, 0.5, 1, 2.5, 5, 10, 30, 60)
+)
+ADMISSION_REJECTED = Counter(
+    "report_admission_rejected_total",
+    "Reports turned away, by reason (queue_full, timeout).",
+    ["reason"]
+)
+
+# Id of the request being served, carried into worker threads by asyncio.to_thread
+request_id = ContextVar("request_id", default=None)
+
+trace_logger = logging.getLogger("merchant_report.trace")
+if REPORT_TRACE_LOGS and not trace_logger.handlers:
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+    trace_logger.addHandler(handler)
+    trace_logger.setLevel(logging.INFO)
+
+
+def trace(event, **fields):
+    """
+    Writes one JSON trace line tagged with the current request id,
+    when REPORT_TRACE_LOGS is enabled.
+    """
+    if REPORT_TRACE_LOGS:
+        trace_logger.info(json.dumps({"request_id": request_id.get(), "event": event, **fields}, default=str))
+
+
+@contextmanager
+def stage(name, **fields):
+    """
+    Times a report stage into report_stage_seconds and traces it.
+    Values added to the yielded dict (e.g. rows) are included in the trace.
+    """
+    details = dict(fields)
+    started = time.perf_counter()
+    try:
+        yield details
+    finally:
+        record_stage(name, time.perf_counter() - started, **details)
+
+
+def record_stage(name, seconds, **details):
+    """
+    Records a stage timed elsewhere, such as a page drawn in a render
+    worker, whose own registry is never scraped.
+    """
+    STAGE_SECONDS.labels(stage=name).observe(seconds)
+    trace(name, seconds=round(seconds, 4), **details)
@@ -0,0 +1,120 @@
+from collections import OrderedDict
+from dataclasses import dataclass, field
+import queue
+import threading
+import time
+import uuid
+
+
+class QueueFullError(Exception):
+    """Raised when a report job is submitted to a full queue."""
+
+
+@dataclass
+class ReportJob:
+    """A report requested through the job API and its progress."""
+    id: str
+    merchant_id: str
+    options: dict = field(default_factory=dict)  # window and profile, passed to run_report
+    status: str = "queued"
+    created_at: float = 0.0
+    started_at: float = None
+    finished_at: float = None
+    error: str = None
+    result: bytes = None
+
+    def to_dict(self):
+        now = time.time()
+        queued_until = self.started_at or self.finished_at or now
+        return {
+            "job_id": self.id,
+            "merchant_id": self.merchant_id,
+            "options": {name: str(value) for name, value in self.options.items() if value is not None},
+            "status": self.status,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "queued_seconds": round(queued_until - self.created_at, 3),
+            "running_seconds": round((self.finished_at or now) - self.started_at, 3) if self.started_at else None,
+            "error": self.error
+        }
+
+
+class ReportJobQueue:
+    """
+    Bounded queue of report jobs served by a fixed pool of worker threads.
+    run_report(merchant_id, **options) must return the report PDF bytes.
+    Finished jobs are kept for download until max_finished newer ones finish.
+    """
+
+    def __init__(self, run_report, concurrency=2, max_queue=100, max_finished=256):
+        self.run_report = run_report
+        self.concurrency = concurrency
+        self.max_finished = max_finished
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._jobs = {}
+        self._finished = OrderedDict()
+        self._lock = threading.Lock()
+        self._workers = []
+
+    def start(self):
+        for i in range(self.concurrency):
+            worker = threading.Thread(target=self._work, name=f"report-job-{i}", daemon=True)
+            worker.start()
+            self._workers.append(worker)
+
+    def stop(self):
+        # One sentinel per worker, queued behind the remaining jobs
+        for _ in self._workers:
+            self._queue.put(None)
+        for worker in self._workers:
+            worker.join()
+        self._workers = []
+
+    def submit(self, merchant_id, **options):
+        """
+        Enqueues a report, built with run_report(merchant_id, **options),
+        and returns its job. Raises QueueFullError when the queue is at
+        capacity.
+        """
+        job = ReportJob(id=uuid.uuid4().hex, merchant_id=merchant_id, options=options, created_at=time.time())
+        with self._lock:
+            self._jobs[job.id] = job
+        try:
+            self._queue.put_nowait(job)
+        except queue.Full:
+            with self._lock:
+                del self._jobs[job.id]
+            raise QueueFullError(f"Report queue is full ({self._queue.maxsize} jobs).")
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def depth(self):
+        return self._queue.qsize()
+
+    def _work(self):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                return
+            job.status = "running"
+            job.started_at = time.time()
+            try:
+                job.result = self.run_report(job.merchant_id, **job.options)
+                job.status = "done"
+            except Exception as exc:
+                job.error = str(exc)
+                job.status = "failed"
+            job.finished_at = time.time()
+            self._retire(job)
+
+    def _retire(self, job):
+        # Forget the oldest finished jobs so results do not pile up in memory
+        with self._lock:
+            self._finished[job.id] = job
+            while len(self._finished) > self.max_finished:
+                old_id, _ = self._finished.popitem(last=False)
+                self._jobs.pop(old_id, None)
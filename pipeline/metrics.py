@@ -0,0 +1,454 @@
+from dataclasses import dataclass
+from datetime import datetime, timedelta, date
+import os
+import sys
+import pandas as pd
+
+# Add the root directory to sys.path
+root_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(root_path)
+from database.schema import conform_report_frame, to_amount
+from pipeline.windows import time_slice, merchant_time_index, merchant_slice
+from pipeline.sketches import UserSketch, merge_sketches
+
+
+@dataclass
+class AmountMetrics:
+    """Inputs of the payment analysis page."""
+    total_paid: float
+    avg_daily_paid: float
+    max_day: date
+    max_amount: float
+    daily_paid: pd.Series
+    window_title: str = "Last 30 Days"
+
+
+@dataclass
+class CountMetrics:
+    """Inputs of the transaction count page."""
+    total_count: int
+    avg_daily_count: float
+    busiest_day: date
+    busiest_count: int
+    slowest_day: date
+    slowest_count: int
+    daily_counts: pd.Series
+    window_title: str = "Last 30 Days"
+
+
+@dataclass
+class StatusMetrics:
+    """Inputs of the transaction status and financial page."""
+    status_counts: pd.Series
+    paid_amount: float
+    net_revenue: float
+    fee: float
+    commission_amount: float
+    window_title: str = "Last 30 Days"
+
+
+@dataclass
+class UserMetrics:
+    """Inputs of the user metrics page."""
+    total_users: int
+    window_users: int
+    new_users: int
+    returning_users: int
+    market_share: float
+    daily_users: pd.Series
+    window_title: str = "Last 30 Days"
+
+
+@dataclass
+class StateMetrics:
+    """Inputs of the user state distribution page."""
+    top_states: pd.Series
+    window_title: str = "Last 30 Days"
+
+
+@dataclass
+class ReportMetrics:
+    """Everything the five report pages draw from, for one merchant and window."""
+    merchant_id: object
+    start: datetime
+    end: datetime
+    amount: AmountMetrics
+    count: CountMetrics
+    status: StatusMetrics
+    users: UserMetrics
+    states: StateMetrics
+
+    def to_dict(self):
+        """
+        JSON-ready view of the KPIs and the daily series behind each chart.
+        """
+        return {
+            "merchant_id": str(self.merchant_id),
+            "window": {
+                "start": self.start.isoformat(),
+                "end": self.end.isoformat(),
+                "title": self.amount.window_title
+            },
+            "amount": {
+                "total_paid": self.amount.total_paid,
+                "avg_daily_paid": self.amount.avg_daily_paid,
+                "highest_day": _day(self.amount.max_day),
+                "highest_amount": self.amount.max_amount,
+                "daily_paid": _series(self.amount.daily_paid, float)
+            },
+            "count": {
+                "total_transactions": self.count.total_count,
+                "avg_daily_transactions": self.count.avg_daily_count,
+                "busiest_day": _day(self.count.busiest_day),
+                "busiest_count": self.count.busiest_count,
+                "slowest_day": _day(self.count.slowest_day),
+                "slowest_count": self.count.slowest_count,
+                "daily_transactions": _series(self.count.daily_counts, int)
+            },
+            "status": {
+                "status_counts": {str(status): int(count) for status, count in self.status.status_counts.items()},
+                "paid_amount": self.status.paid_amount,
+                "net_revenue": self.status.net_revenue,
+                "fee": self.status.fee,
+                "commission_amount": self.status.commission_amount
+            },
+            "users": {
+                "total_unique_users": self.users.total_users,
+                "window_users": self.users.window_users,
+                "new_users": self.users.new_users,
+                "returning_users": self.users.returning_users,
+                "market_share": self.users.market_share,
+                "daily_users": _series(self.users.daily_users, int)
+            },
+            "states": {
+                "top_states": [
+                    {"state": str(state), "users": int(users)}
+                    for state, users in self.states.top_states.items()
+                ]
+            }
+        }
+
+
+def _day(day):
+    return day.isoformat() if day is not None else None
+
+
+def _series(series, cast):
+    # Daily series as a list of {"day", "value"} points
+    return [{"day": _day(day), "value": cast(value)} for day, value in series.items()]
+
+
+def _peak(series, largest=True):
+    # Day and value of the highest (or lowest) bucket, None on an empty window
+    if series.empty:
+        return None, 0
+    day = series.idxmax() if largest else series.idxmin()
+    return day, series[day]
+
+
+def build_metrics(merchant_id, start, end, daily, status_counts, paid_amount, fee,
+                  commission_amount, window_users, total_users, total_platform_users,
+                  user_state_dist, top_states=10, window_title="Last 30 Days", returning_users=0):
+    """
+    Assembles ReportMetrics from one merchant's aggregates.
+    daily is indexed by day with paid_amount, transactions and users columns.
+    window_users counts the window's distinct users and returning_users
+    those of them who also paid before the window; the rest are new users.
+    window_title names the window on every page.
+    """
+    daily_paid = daily['paid_amount']
+    daily_counts = daily['transactions']
+    daily_users = daily['users']
+
+    # Payment amounts
+    max_day, max_amount = _peak(daily_paid)
+    amount = AmountMetrics(
+        total_paid=float(daily_paid.sum()),
+        avg_daily_paid=float(daily_paid.mean()) if len(daily_paid) else 0.0,
+        max_day=max_day,
+        max_amount=float(max_amount),
+        daily_paid=daily_paid,
+        window_title=window_title
+    )
+
+    # Transaction counts
+    busiest_day, busiest_count = _peak(daily_counts)
+    slowest_day, slowest_count = _peak(daily_counts, largest=False)
+    count = CountMetrics(
+        total_count=int(daily_counts.sum()),
+        avg_daily_count=float(daily_counts.mean()) if len(daily_counts) else 0.0,
+        busiest_day=busiest_day,
+        busiest_count=int(busiest_count),
+        slowest_day=slowest_day,
+        slowest_count=int(slowest_count),
+        daily_counts=daily_counts,
+        window_title=window_title
+    )
+
+    # Status breakdown and financial totals
+    status = StatusMetrics(
+        status_counts=status_counts,
+        paid_amount=float(paid_amount),
+        net_revenue=float(paid_amount - fee - commission_amount),
+        fee=float(fee),
+        commission_amount=float(commission_amount),
+        window_title=window_title
+    )
+
+    # Users
+    users = UserMetrics(
+        total_users=int(total_users),
+        window_users=int(window_users),
+        new_users=int(window_users) - int(returning_users),
+        returning_users=int(returning_users),
+        market_share=(total_users / total_platform_users) * 100 if total_platform_users else 0.0,
+        daily_users=daily_users,
+        window_title=window_title
+    )
+
+    states = StateMetrics(top_states=user_state_dist.head(top_states), window_title=window_title)
+
+    return ReportMetrics(
+        merchant_id=merchant_id,
+        start=start,
+        end=end,
+        amount=amount,
+        count=count,
+        status=status,
+        users=users,
+        states=states
+    )
+
+
+def _select_window(df, start, end):
+    # Bring the frame to the report schema if needed and slice out the [start, end) window
+    return time_slice(conform_report_frame(df), start, end)
+
+
+def compute_metrics(merchant_df, merchant_id, start, end, total_users,
+                    total_platform_users, user_state_dist, top_states=10, window_title="Last 30 Days",
+                    returning_users=0):
+    """
+    Builds the report metrics from one merchant's transactions in a single pass.
+    The frame is conformed to the report schema once, the window is selected
+    once and every daily series comes from one groupby over the day bucket.
+    Money is summed in cents and converted back to amounts afterwards.
+    """
+    window = _select_window(merchant_df, start, end)
+
+    # Bucket by day once and compute every daily series together
+    daily = window.groupby(window['payment_date'].dt.date).agg(
+        paid_amount=('paid_amount', 'sum'),
+        transactions=('payment_date', 'size'),
+        users=('user_id', 'nunique')
+    )
+    daily['paid_amount'] = to_amount(daily['paid_amount'])
+    status_counts = window['status'].value_counts()
+
+    return build_metrics(
+        merchant_id,
+        start,
+        end,
+        daily,
+        status_counts=status_counts[status_counts > 0],
+        paid_amount=to_amount(window['paid_amount'].sum()),
+        fee=to_amount(window['fee'].sum()),
+        commission_amount=to_amount(window['commission_amount'].sum()),
+        window_users=window['user_id'].nunique(),
+        total_users=total_users,
+        total_platform_users=total_platform_users,
+        user_state_dist=user_state_dist,
+        top_states=top_states,
+        window_title=window_title,
+        returning_users=returning_users
+    )
+
+
+def compute_metrics_bulk(df, start, end, total_users, total_platform_users,
+                         user_state_dist, merchant_ids=None, top_states=10, window_title="Last 30 Days",
+                         returning_users=None):
+    """
+    Builds the report metrics of many merchants from one frame.
+    Every aggregate comes from a single groupby keyed on merchant_id, and each
+    merchant's metrics are then sliced out of the grouped results.
+    total_users and returning_users map merchant_id to its all-time user
+    count and to its window users who paid before the window, and
+    user_state_dist is a Series indexed by (merchant_id, state).
+    Returns a dict of merchant_id to ReportMetrics.
+    """
+    window = _select_window(df, start, end)
+    day = window['payment_date'].dt.date.rename('day')
+
+    daily = window.groupby([window['merchant_id'], day]).agg(
+        paid_amount=('paid_amount', 'sum'),
+        transactions=('payment_date', 'size'),
+        users=('user_id', 'nunique')
+    )
+    daily['paid_amount'] = to_amount(daily['paid_amount'])
+    status_counts = window.groupby(['merchant_id', 'status'], observed=True).size()
+    totals = window.groupby('merchant_id').agg(
+        paid_amount=('paid_amount', 'sum'),
+        fee=('fee', 'sum'),
+        commission_amount=('commission_amount', 'sum'),
+        window_users=('user_id', 'nunique')
+    )
+    for column in ('paid_amount', 'fee', 'commission_amount'):
+        totals[column] = to_amount(totals[column])
+
+    if merchant_ids is None:
+        merchant_ids = totals.index.tolist()
+    returning_users = returning_users or {}
+    empty_daily = daily.iloc[:0].droplevel('merchant_id')
+    empty_counts = pd.Series(dtype='int64', name='count')
+    # Looked up once, not per merchant
+    state_merchants = set(user_state_dist.index.get_level_values(0))
+
+    metrics = {}
+    for merchant_id in merchant_ids:
+        active = merchant_id in totals.index
+        merchant_totals = totals.loc[merchant_id] if active else {}
+        metrics[merchant_id] = build_metrics(
+            merchant_id,
+            start,
+            end,
+            daily.loc[merchant_id] if active else empty_daily,
+            status_counts=(
+                status_counts.loc[merchant_id].sort_values(ascending=False).rename('count')
+                if active else empty_counts
+            ),
+            paid_amount=merchant_totals.get('paid_amount', 0.0),
+            fee=merchant_totals.get('fee', 0.0),
+            commission_amount=merchant_totals.get('commission_amount', 0.0),
+            window_users=merchant_totals.get('window_users', 0),
+            total_users=total_users.get(merchant_id, 0),
+            total_platform_users=total_platform_users,
+            user_state_dist=(
+                user_state_dist.loc[merchant_id].sort_values(ascending=False)
+                if merchant_id in state_merchants else empty_counts
+            ),
+            top_states=top_states,
+            window_title=window_title,
+            returning_users=returning_users.get(merchant_id, 0)
+        )
+    return metrics
+
+
+class MetricsAccumulator:
+    """
+    Folds one merchant's window rows into running aggregates chunk by chunk,
+    so a chunk can be dropped as soon as it has been added. Daily paid
+    amounts and counts, status counts and money totals are exact. Distinct
+    users are kept as one UserSketch per day, exact up to SKETCH_EXACT_LIMIT
+    users a day, and merged for the window.
+    """
+
+    def __init__(self):
+        self.rows = 0
+        self.daily = None
+        self.status_counts = pd.Series(dtype='int64')
+        self.totals = {'paid_amount': 0, 'fee': 0, 'commission_amount': 0}
+        self.day_users = {}
+
+    def add(self, chunk):
+        chunk = conform_report_frame(chunk)
+        if chunk.empty:
+            return self
+        self.rows += len(chunk)
+        day = chunk['payment_date'].dt.date
+
+        daily = chunk.groupby(day).agg(
+            paid_amount=('paid_amount', 'sum'),
+            transactions=('payment_date', 'size')
+        )
+        self.daily = daily if self.daily is None else self.daily.add(daily, fill_value=0)
+
+        status_counts = chunk['status'].value_counts()
+        status_counts.index = status_counts.index.astype(str)
+        self.status_counts = self.status_counts.add(status_counts, fill_value=0)
+
+        for column in self.totals:
+            self.totals[column] += int(chunk[column].sum())
+
+        users = chunk['user_id']
+        for bucket, ids in users[users.notna()].groupby(day):
+            self.day_users.setdefault(bucket, UserSketch()).add(ids.to_numpy(dtype='int64'))
+        return self
+
+    def to_metrics(self, merchant_id, start, end, total_users, total_platform_users,
+                   user_state_dist, top_states=10, window_title="Last 30 Days", returning_users=0):
+        """
+        Builds ReportMetrics from everything added so far.
+        """
+        if self.daily is None:
+            daily = pd.DataFrame({
+                'paid_amount': pd.Series(dtype='float64'),
+                'transactions': pd.Series(dtype='int64'),
+                'users': pd.Series(dtype='int64')
+            })
+        else:
+            daily = self.daily.sort_index()
+            daily['paid_amount'] = to_amount(daily['paid_amount'])
+            daily['transactions'] = daily['transactions'].astype('int64')
+            daily['users'] = pd.Series(
+                {bucket: sketch.count() for bucket, sketch in self.day_users.items()}, dtype='int64'
+            ).reindex(daily.index, fill_value=0)
+        daily.index.name = 'payment_date'
+
+        status_counts = self.status_counts[self.status_counts > 0].astype('int64')
+        status_counts = status_counts.sort_values(ascending=False).rename('count').rename_axis('status')
+        return build_metrics(
+            merchant_id,
+            start,
+            end,
+            daily,
+            status_counts=status_counts,
+            paid_amount=to_amount(self.totals['paid_amount']),
+            fee=to_amount(self.totals['fee']),
+            commission_amount=to_amount(self.totals['commission_amount']),
+            window_users=merge_sketches(self.day_users.values()).count(),
+            total_users=total_users,
+            total_platform_users=total_platform_users,
+            user_state_dist=user_state_dist,
+            top_states=top_states,
+            window_title=window_title,
+            returning_users=returning_users
+        )
+
+
+def count_returning_users(history, start, end):
+    """
+    Counts the distinct users of the [start, end) window who already paid
+    before start, from a frame holding the merchant's history.
+    """
+    before = history.loc[history['payment_date'] < start, 'user_id']
+    window = time_slice(history, start, end)['user_id']
+    return int(window[window.isin(before)].nunique())
+
+
+def metrics_from_frame(merged_df, merchant_id, start=None, end=None, top_states=10,
+                       window_title="Last 30 Days"):
+    """
+    Builds the report metrics from an in-memory copy of the full report view
+    (e.g. Data/MOCK_DATA.csv). The whole-history and platform-wide numbers
+    are derived from the frame instead of the aggregate queries.
+    The merchant and its window are binary-searched slices of the frame,
+    which is sorted by merchant_time_index() unless it already is.
+    """
+    end = end or datetime.now()
+    start = start or end - timedelta(days=30)
+    merged_df = merchant_time_index(conform_report_frame(merged_df))
+    merchant_df = merchant_slice(merged_df, merchant_id)
+    user_state_dist = merchant_df.groupby('user_id')['state'].first().value_counts()
+    user_state_dist = user_state_dist[user_state_dist > 0]
+    return compute_metrics(
+        merchant_df,
+        merchant_id,
+        start,
+        end,
+        total_users=merchant_df['user_id'].nunique(),
+        total_platform_users=merged_df.shape[0],
+        user_state_dist=user_state_dist,
+        top_states=top_states,
+        window_title=window_title,
+        returning_users=count_returning_users(merchant_df, start, end)
+    )
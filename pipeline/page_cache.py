@@ -0,0 +1,117 @@
+from dataclasses import fields
+from datetime import datetime
+from importlib.util import find_spec
+import hashlib
+import json
+import os
+import sys
+import pandas as pd
+
+# Add the root directory to sys.path
+root_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(root_path)
+from pipeline.pages import REPORT_PAGES
+from pipeline.create_pdf import output_variant
+from pipeline.report_cache import ReportCache
+from pipeline.instrumentation import PAGE_CACHE_LOOKUPS
+from config import (
+    PAGE_CACHE_DIR,
+    PAGE_CACHE_MAX_ENTRIES,
+    PAGE_CACHE_MAX_MEMORY_BYTES,
+    PAGE_CACHE_MAX_DISK_BYTES,
+    PAGE_CACHE_TTL
+)
+
+# Modules whose code shapes every page, besides the page's own renderer
+SHARED_PAGE_MODULES = ["pipeline.page_template", "pipeline.create_pdf"]
+
+_code_digests = {}
+
+
+def _code_digest(index):
+    # Hash of the code drawing page index, so a deploy never serves old pages
+    if index not in _code_digests:
+        digest = hashlib.sha256()
+        module_names = [REPORT_PAGES[index][1].split(":")[0]] + SHARED_PAGE_MODULES
+        for module_name in module_names:
+            # Located without importing, so the plotting stack stays in the render workers
+            with open(find_spec(module_name).origin, "rb") as f:
+                digest.update(f.read())
+        _code_digests[index] = digest.hexdigest()
+    return _code_digests[index]
+
+
+def _hash_value(digest, value):
+    if isinstance(value, (pd.Series, pd.DataFrame)):
+        digest.update(repr((getattr(value, "name", None), str(getattr(value, "dtype", "")))).encode("utf-8"))
+        digest.update(pd.util.hash_pandas_object(value, index=True).to_numpy().tobytes())
+    else:
+        digest.update(json.dumps(value, sort_keys=True, default=str).encode("utf-8"))
+
+
+def section_digest(section_metrics):
+    """
+    Hashes the exact values a page draws from: every field of its metrics
+    section, with series hashed by index and values.
+    """
+    digest = hashlib.sha256()
+    for field in fields(section_metrics):
+        digest.update(field.name.encode("utf-8"))
+        _hash_value(digest, getattr(section_metrics, field.name))
+    return digest.hexdigest()
+
+
+def page_cache_key(index, section_metrics, backend, profile):
+    """
+    Cache key of one rendered page: the page, its inputs, the code drawing
+    it, and the backend and output profile it was rendered with.
+    """
+    raw = json.dumps([REPORT_PAGES[index][0], section_digest(section_metrics), _code_digest(index),
+                      output_variant(backend, profile)])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:32]
+
+
+# One page cache per process, opened on first use
+_cache = None
+
+
+def get_page_cache():
+    global _cache
+    if _cache is None:
+        _cache = ReportCache(
+            PAGE_CACHE_DIR,
+            max_entries=PAGE_CACHE_MAX_ENTRIES,
+            max_memory_bytes=PAGE_CACHE_MAX_MEMORY_BYTES,
+            max_disk_bytes=PAGE_CACHE_MAX_DISK_BYTES,
+            ttl=PAGE_CACHE_TTL
+        )
+    return _cache
+
+
+def render_pages_cached(metrics, backend, profile, render, cache=None):
+    """
+    Returns every report page in PDF order, re-rendering only the pages
+    whose inputs changed since they were last rendered.
+    render(metrics, backend, profile, indices) draws the listed pages, e.g.
+    pages.render_pages or parallel.render_pages_parallel. Returns the pages
+    and the number served from the cache.
+    """
+    cache = cache or get_page_cache()
+    keys = [
+        page_cache_key(index, getattr(metrics, section), backend, profile)
+        for index, (name, renderer, section, savefig_kwargs) in enumerate(REPORT_PAGES)
+    ]
+    pages = []
+    for index, key in enumerate(keys):
+        cached = cache.get(key)
+        PAGE_CACHE_LOOKUPS.labels(page=REPORT_PAGES[index][0], result="miss" if cached is None else "hit").inc()
+        pages.append(None if cached is None else cached.content)
+
+    missing = [index for index, page in enumerate(pages) if page is None]
+    if missing:
+        rendered = dict(zip(missing, render(metrics, backend, profile, missing)))
+        # One write batch per report, so the disk is evicted once, not once per page
+        cache.put_many({keys[index]: page for index, page in rendered.items()}, datetime.now())
+        for index, page in rendered.items():
+            pages[index] = page
+    return pages, len(pages) - len(missing)
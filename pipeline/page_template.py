@@ -0,0 +1,49 @@
+from matplotlib.dates import DayLocator
+from matplotlib.figure import Figure
+from matplotlib.patches import Rectangle
+
+# A4 portrait, in inches
+A4_SIZE = (8.27, 11.69)
+
+
+def new_page(title, separator_y=None, title_y=0.96):
+    """
+    Creates an A4 report page: a surrounding box, the coloured header band
+    holding the title, and an optional horizontal separator at separator_y.
+    The page is a standalone Figure, not registered with pyplot, so it is
+    freed as soon as the caller drops it.
+    """
+    fig = Figure(figsize=A4_SIZE)
+
+    # Surrounding box
+    fig.patches.append(Rectangle((0.01, 0.01), 0.98, 0.98, linewidth=2, edgecolor='black',
+                                 facecolor='none', transform=fig.transFigure, zorder=-1))
+
+    # Header band
+    fig.patches.append(Rectangle((0.01, 0.91), 0.98, 0.08, linewidth=1.5, edgecolor='black',
+                                 facecolor='#b7cbbf', transform=fig.transFigure, zorder=-1))
+
+    # Horizontal separator line
+    if separator_y is not None:
+        fig.patches.append(Rectangle((0.01, separator_y), 0.98, 0.002, linewidth=1.5, edgecolor='black',
+                                     facecolor='none', transform=fig.transFigure, zorder=-1))
+
+    fig.suptitle(title, fontsize=18, y=title_y)
+    return fig
+
+
+def day_locator(daily, interval=1, max_ticks=31):
+    """
+    Day ticks for a daily series: every interval days, spaced further apart
+    on long windows (quarters, years) so at most max_ticks dates are labelled.
+    """
+    span = (max(daily.index) - min(daily.index)).days + 1 if len(daily) else 0
+    return DayLocator(interval=max(interval, -(-span // max_ticks)))
+
+
+def release_page(fig):
+    """
+    Drops the artists of a rendered page. savefig draws on a temporary Agg
+    canvas that is gone once it returns, so the page keeps no pixel buffer.
+    """
+    fig.clear()
@@ -0,0 +1,106 @@
+from pipeline.create_pdf import render_figure, assemble_pdf
+from pipeline.instrumentation import stage
+from importlib import import_module
+import io
+import time
+
+# Report pages in PDF order: name, renderer ("module:function", imported on
+# first render), metrics section it draws from, and the savefig options of the page
+REPORT_PAGES = [
+    ("payment_analysis_last_month", "pipeline.total_amount:total_amount_calc", "amount", {"bbox_inches": "tight"}),
+    ("transaction_count_analysis_last_month", "pipeline.total_count:total_count_calc", "count", {"bbox_inches": "tight"}),
+    ("financial_performance_analysis", "pipeline.status_analysis:transaction_status_analysis", "status", {"bbox_inches": "tight"}),
+    ("daily_user_metrics", "pipeline.user_analysis:user_analysis_metrics", "users", {"bbox_inches": "tight"}),
+    ("user_state_distribution", "pipeline.user_distriution:user_state_distribution", "states", {})
+]
+
+_plotting_loaded = False
+
+
+def load_plotting():
+    """
+    Imports matplotlib and seaborn and applies the report style.
+    Runs once per process, on the first render or from warm_up().
+    """
+    global _plotting_loaded
+    if _plotting_loaded:
+        return
+    import matplotlib
+    matplotlib.use("Agg")
+    import seaborn as sns
+    sns.set_style('whitegrid')
+    _plotting_loaded = True
+
+
+def get_renderer(index):
+    """
+    Returns the drawing function of page number index, importing its module.
+    """
+    load_plotting()
+    module_name, function_name = REPORT_PAGES[index][1].split(":")
+    return getattr(import_module(module_name), function_name)
+
+
+def warm_up():
+    """
+    Loads the plotting stack, every page module, the Agg backend and the
+    font cache, so the first report does not pay for them.
+    """
+    load_plotting()
+    for index in range(len(REPORT_PAGES)):
+        get_renderer(index)
+    from matplotlib.figure import Figure
+    fig = Figure(figsize=(2, 2))
+    fig.suptitle("Warm-up", fontsize=18, weight="bold")
+    fig.add_subplot().text(0.5, 0.5, "$0.00", fontsize=12)
+    for backend in ("png", "pdf"):
+        fig.savefig(io.BytesIO(), format=backend)
+
+
+def render_page(index, section_metrics, backend="vector", profile=None):
+    """
+    Draws page number index of REPORT_PAGES from its metrics section and
+    returns the page bytes rendered with the output profile. The page's
+    figure is released before returning, so nothing outlives the call.
+    """
+    with stage(f"render:{REPORT_PAGES[index][0]}", backend=backend, profile=profile):
+        return _draw_page(index, section_metrics, backend, profile)
+
+
+def render_page_timed(index, section_metrics, backend="vector", profile=None):
+    """
+    Same as render_page but returns (page bytes, seconds) instead of
+    recording the time, for render workers to hand back to their caller.
+    """
+    started = time.perf_counter()
+    page = _draw_page(index, section_metrics, backend, profile)
+    return page, time.perf_counter() - started
+
+
+def _draw_page(index, section_metrics, backend, profile):
+    from pipeline.page_template import release_page
+
+    savefig_kwargs = REPORT_PAGES[index][3]
+    fig = get_renderer(index)(section_metrics)
+    try:
+        return render_figure(fig, backend, profile, **savefig_kwargs)
+    finally:
+        release_page(fig)
+
+
+def render_pages(metrics, backend="vector", profile=None, indices=None):
+    """
+    Draws the report pages (every page, or those numbered in indices) in
+    memory, in order. Pages are single-page PDFs for the vector backend
+    and PNGs for raster.
+    """
+    if indices is None:
+        indices = range(len(REPORT_PAGES))
+    return [render_page(index, getattr(metrics, REPORT_PAGES[index][2]), backend, profile) for index in indices]
+
+
+def render_report(metrics, backend="vector", profile=None):
+    """
+    Draws every page and returns the assembled report PDF bytes.
+    """
+    return assemble_pdf(render_pages(metrics, backend, profile), backend, profile=profile)
@@ -0,0 +1,81 @@
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+import os
+import sys
+
+# Add the root directory to sys.path
+root_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(root_path)
+from pipeline.pages import REPORT_PAGES, render_page_timed, warm_up
+from pipeline.instrumentation import record_stage, request_id
+from config import RENDER_WORKERS
+
+# One warm pool of render processes per service process
+_pool = None
+
+
+def _warm_worker():
+    # Load the plotting stack and font cache in the worker
+    warm_up()
+    return os.getpid()
+
+
+def _render_page(index, section_metrics, backend, profile, caller_request_id):
+    # Runs in a render worker: traces carry the caller's request id, and the
+    # page's time goes back to the caller to record
+    request_id.set(caller_request_id)
+    return render_page_timed(index, section_metrics, backend, profile)
+
+
+def get_render_pool():
+    """
+    Returns the process-wide render pool, creating it on first use.
+    Workers are spawned rather than forked so they never inherit the
+    event loop, threads or database connections of the service.
+    """
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(
+            max_workers=RENDER_WORKERS,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+    return _pool
+
+
+def warm_render_pool():
+    """
+    Starts every render worker and loads its plotting stack up front.
+    """
+    pool = get_render_pool()
+    futures = [pool.submit(_warm_worker) for _ in range(RENDER_WORKERS)]
+    return {future.result() for future in futures}
+
+
+def shutdown_render_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(cancel_futures=True)
+        _pool = None
+
+
+def render_pages_parallel(metrics, backend="vector", profile=None, indices=None):
+    """
+    Draws the report pages (every page, or those numbered in indices)
+    concurrently on the render pool. Each worker only receives its page's
+    metrics section, and pages come back in order. Page render times are
+    recorded here, under the current request id.
+    """
+    pool = get_render_pool()
+    if indices is None:
+        indices = range(len(REPORT_PAGES))
+    futures = [
+        pool.submit(_render_page, index, getattr(metrics, REPORT_PAGES[index][2]), backend, profile,
+                    request_id.get())
+        for index in indices
+    ]
+    pages = []
+    for index, future in zip(indices, futures):
+        page, seconds = future.result()
+        record_stage(f"render:{REPORT_PAGES[index][0]}", seconds, backend=backend, profile=profile)
+        pages.append(page)
+    return pages
@@ -0,0 +1,407 @@
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import closing, nullcontext
+from datetime import date, datetime, timedelta
+import argparse
+import json
+import logging
+import os
+import sqlite3
+import sys
+import threading
+import time
+import uuid
+
+# Add the root directory to sys.path
+root_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(root_path)
+from database.engine import get_engine
+from database.queries import fetch_merchant_watermarks
+from pipeline.final_pipeline import run_pipeline
+from pipeline.windows import resolve_window
+from pipeline.report_cache import ReportCache, report_cache_key
+from pipeline.create_pdf import get_profile, output_variant
+from pipeline.snapshot import get_snapshot
+from pipeline.rollups import get_rollup_store
+from config import (
+    PDF_BACKEND,
+    METRICS_SOURCE,
+    REPORT_CACHE_DIR,
+    REPORT_CACHE_MAX_ENTRIES,
+    REPORT_CACHE_MAX_MEMORY_BYTES,
+    REPORT_CACHE_MAX_DISK_BYTES,
+    REPORT_CACHE_TTL,
+    PREBUILD_DB_PATH,
+    PREBUILD_WORKERS,
+    PREBUILD_BUDGET_SECONDS,
+    PREBUILD_LOOKBACK_DAYS,
+    PREBUILD_TTL
+)
+
+logger = logging.getLogger("merchant_report.prebuild")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS report_requests (
+    merchant_id TEXT NOT NULL,
+    day TEXT NOT NULL,
+    requests INTEGER NOT NULL,
+    PRIMARY KEY (merchant_id, day)
+);
+CREATE TABLE IF NOT EXISTS prebuild_runs (
+    run_id TEXT PRIMARY KEY,
+    started_at TEXT NOT NULL,
+    finished_at TEXT,
+    budget_seconds REAL NOT NULL,
+    candidates INTEGER,
+    built INTEGER,
+    failed INTEGER,
+    skipped INTEGER
+);
+CREATE TABLE IF NOT EXISTS prebuild_builds (
+    run_id TEXT NOT NULL,
+    merchant_id TEXT NOT NULL,
+    status TEXT NOT NULL,
+    requests INTEGER NOT NULL,
+    changed_rows INTEGER NOT NULL,
+    row_count INTEGER NOT NULL,
+    seconds REAL,
+    bytes INTEGER,
+    error TEXT,
+    PRIMARY KEY (run_id, merchant_id)
+);
+"""
+
+
+class PrebuildStore:
+    """
+    SQLite record of the pre-generation runs: daily report request counts
+    per merchant, which is how merchants are prioritised, and every run and
+    build with its outcome and duration.
+    Requests are counted in memory and written by flush(), so serving a
+    report never waits on the file.
+    """
+
+    def __init__(self, path=PREBUILD_DB_PATH):
+        self.path = path
+        self._pending = Counter()
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with closing(self._connect()) as db:
+            db.executescript(SCHEMA)
+
+    def _connect(self):
+        return sqlite3.connect(self.path)
+
+    def record_request(self, merchant_id):
+        with self._lock:
+            self._pending[(str(merchant_id), date.today().isoformat())] += 1
+
+    def flush(self):
+        """
+        Writes the request counts gathered since the last flush.
+        """
+        with self._lock:
+            pending, self._pending = self._pending, Counter()
+        if not pending:
+            return
+        with closing(self._connect()) as db, db:
+            db.executemany(
+                "INSERT INTO report_requests VALUES (?, ?, ?) "
+                "ON CONFLICT (merchant_id, day) DO UPDATE SET requests = requests + excluded.requests",
+                [(merchant_id, day, requests) for (merchant_id, day), requests in pending.items()]
+            )
+
+    def request_counts(self, since):
+        """
+        Returns each merchant's report requests from the day since onwards.
+        """
+        with closing(self._connect()) as db:
+            rows = db.execute(
+                "SELECT merchant_id, SUM(requests) FROM report_requests WHERE day >= ? GROUP BY merchant_id",
+                (since.isoformat(),)
+            )
+            return dict(rows.fetchall())
+
+    def built_row_counts(self):
+        """
+        Returns the row count each merchant had at its latest successful build.
+        """
+        with closing(self._connect()) as db:
+            # Oldest first, so each merchant ends up with its latest build
+            rows = db.execute(
+                "SELECT merchant_id, row_count FROM prebuild_builds JOIN prebuild_runs USING (run_id) "
+                "WHERE status = 'done' ORDER BY started_at"
+            )
+            return dict(rows.fetchall())
+
+    def start_run(self, budget_seconds):
+        run_id = uuid.uuid4().hex
+        with closing(self._connect()) as db, db:
+            db.execute(
+                "INSERT INTO prebuild_runs (run_id, started_at, budget_seconds) VALUES (?, ?, ?)",
+                (run_id, datetime.now().isoformat(), budget_seconds)
+            )
+        return run_id
+
+    def record_build(self, run_id, build):
+        with closing(self._connect()) as db, db:
+            db.execute(
+                "INSERT OR REPLACE INTO prebuild_builds VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (run_id, build["merchant_id"], build["status"], build["requests"], build["changed_rows"],
+                 build["row_count"], build.get("seconds"), build.get("bytes"), build.get("error"))
+            )
+
+    def finish_run(self, run_id, summary):
+        with closing(self._connect()) as db, db:
+            db.execute(
+                "UPDATE prebuild_runs SET finished_at = ?, candidates = ?, built = ?, failed = ?, skipped = ? "
+                "WHERE run_id = ?",
+                (datetime.now().isoformat(), summary["candidates"], summary["built"], summary["failed"],
+                 summary["skipped"], run_id)
+            )
+
+    def last_run_started(self):
+        """
+        Returns when the latest run started, or None.
+        """
+        with closing(self._connect()) as db:
+            row = db.execute("SELECT MAX(started_at) FROM prebuild_runs").fetchone()
+        return datetime.fromisoformat(row[0]) if row[0] else None
+
+    def runs(self, limit=10):
+        """
+        Returns the latest runs, newest first, each with its builds.
+        """
+        with closing(self._connect()) as db:
+            db.row_factory = sqlite3.Row
+            runs = [dict(row) for row in db.execute(
+                "SELECT * FROM prebuild_runs ORDER BY started_at DESC LIMIT ?", (limit,)
+            )]
+            for run in runs:
+                run["builds"] = [dict(row) for row in db.execute(
+                    "SELECT merchant_id, status, requests, changed_rows, seconds, bytes, error "
+                    "FROM prebuild_builds WHERE run_id = ? ORDER BY seconds DESC", (run["run_id"],)
+                )]
+        return runs
+
+
+def _report_watermark(watermark):
+    # The watermark /report/ keys the merchant's report by
+    if METRICS_SOURCE == "snapshot":
+        return {"snapshot": get_snapshot().watermark()}
+    if METRICS_SOURCE == "rollups":
+        return dict(watermark, rollups=get_rollup_store().watermark())
+    return watermark
+
+
+def plan_prebuild(watermarks, requests, built_row_counts, window):
+    """
+    Picks the merchants whose reports are worth building ahead: those with
+    payments in the window or report requests in the lookback period.
+    Returns them most requested first, then by how many rows changed since
+    their last build.
+    """
+    plan = []
+    for merchant_id, watermark in watermarks.items():
+        merchant_requests = requests.get(str(merchant_id), 0)
+        active = watermark["last_payment"] is not None and watermark["last_payment"] >= window.start
+        if not active and not merchant_requests:
+            continue
+        changed_rows = watermark["row_count"] - built_row_counts.get(str(merchant_id), 0)
+        plan.append({
+            "merchant_id": merchant_id,
+            "watermark": watermark,
+            "requests": merchant_requests,
+            "changed_rows": changed_rows
+        })
+    plan.sort(key=lambda entry: (-entry["requests"], -abs(entry["changed_rows"])))
+    return plan
+
+
+def run_prebuild(cache, store, workers=PREBUILD_WORKERS, budget_seconds=PREBUILD_BUDGET_SECONDS,
+                 backend=PDF_BACKEND, profile=None, ttl=PREBUILD_TTL, admission=None):
+    """
+    Builds the default report ("last 30 days as of today", default profile)
+    of every planned merchant whose current report is not cached yet, on
+    workers threads. No build starts after budget_seconds; builds already
+    running are finished. Each build resolves the window when it starts, so
+    a run crossing midnight builds the new day's reports. Reports are cached for ttl seconds under the key
+    /report/ looks up, so they are served until the merchant's data changes.
+    In the service, each build first holds its cost on the admission
+    controller shared with on-demand reports.
+    Returns the run summary, which is also recorded in store.
+    """
+    started = time.monotonic()
+    # Picks the active merchants; every build resolves its own window
+    window = resolve_window()
+    profile = get_profile(profile).name
+    store.flush()
+    with get_engine().connect() as conn:
+        watermarks = fetch_merchant_watermarks(conn)
+    since = date.today() - timedelta(days=PREBUILD_LOOKBACK_DAYS)
+    plan = plan_prebuild(watermarks, store.request_counts(since), store.built_row_counts(), window)
+
+    run_id = store.start_run(budget_seconds)
+    summary = {"run_id": run_id, "candidates": len(plan), "built": 0, "current": 0, "failed": 0, "skipped": 0}
+
+    def build(entry):
+        # Returns None when the report of the build's window is already cached
+        build_window = resolve_window()
+        key = report_cache_key(entry["merchant_id"], build_window.key, _report_watermark(entry["watermark"]),
+                               output_variant(backend, profile))
+        if cache.get(key) is not None:
+            return None
+        build_started = time.perf_counter()
+        gate = nullcontext() if admission is None else admission.hold(admission.cost(entry["watermark"]["row_count"]))
+        with gate:
+            pdf = run_pipeline(entry["merchant_id"], backend, profile=profile)
+        last_modified = entry["watermark"]["last_payment"] or build_window.end
+        cache.put(key, pdf, last_modified, ttl=ttl)
+        return len(pdf), time.perf_counter() - build_started
+
+    pending = list(plan)
+    running = {}
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="prebuild") as pool:
+        while pending or running:
+            # Keep every worker busy until the budget is spent
+            while pending and len(running) < workers and time.monotonic() - started < budget_seconds:
+                entry = pending.pop(0)
+                running[pool.submit(build, entry)] = entry
+            if not running:
+                break
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                entry = running.pop(future)
+                result = {
+                    "merchant_id": str(entry["merchant_id"]),
+                    "requests": entry["requests"],
+                    "changed_rows": entry["changed_rows"],
+                    "row_count": entry["watermark"]["row_count"]
+                }
+                try:
+                    built = future.result()
+                except Exception as exc:
+                    result.update(status="failed", error=str(exc))
+                    summary["failed"] += 1
+                    logger.warning("Pre-building the report of merchant %s failed: %s", entry["merchant_id"], exc)
+                else:
+                    if built is None:
+                        summary["current"] += 1
+                        continue
+                    size, seconds = built
+                    result.update(status="done", bytes=size, seconds=round(seconds, 3))
+                    summary["built"] += 1
+                store.record_build(run_id, result)
+
+    summary["skipped"] = len(pending)
+    summary["seconds"] = round(time.monotonic() - started, 3)
+    store.finish_run(run_id, summary)
+    logger.info(
+        "Pre-built %d of %d reports in %.2fs (%d already current, %d failed, %d over budget)",
+        summary["built"], summary["candidates"], summary["seconds"], summary["current"],
+        summary["failed"], summary["skipped"]
+    )
+    return summary
+
+
+def parse_hours(hours):
+    """
+    Parses an off-peak window such as "1-5" (01:00 to 05:00) or "22-4".
+    Returns (first_hour, end_hour), or None for an empty string.
+    """
+    if not hours:
+        return None
+    first, end = (int(hour) for hour in hours.split("-"))
+    if not (0 <= first < 24 and 0 <= end <= 24):
+        raise ValueError(f"Invalid off-peak hours: {hours}")
+    return first, end
+
+
+def in_hours(hours, now):
+    first, end = hours
+    if first <= end:
+        return first <= now.hour < end
+    return now.hour >= first or now.hour < end
+
+
+class PrebuildScheduler:
+    """
+    Background thread of the service. Every interval seconds it flushes the
+    request counts and, once a day inside the off-peak hours, runs run_build.
+    With hours None it only flushes, builds then come from the CLI.
+    """
+
+    def __init__(self, store, run_build, hours=None, interval=60):
+        self.store = store
+        self.run_build = run_build
+        self.hours = hours
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._loop, name="report-prebuild", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.store.flush()
+
+    def _due(self, now):
+        if self.hours is None or not in_hours(self.hours, now):
+            return False
+        # Once per window: no run started within the window's length
+        last = self.store.last_run_started()
+        length = timedelta(hours=(self.hours[1] - self.hours[0]) % 24 or 24)
+        return last is None or now - last >= length
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.store.flush()
+                if self._due(datetime.now()):
+                    self.run_build()
+            except Exception:
+                logger.exception("Report pre-build failed")
+
+
+# One store per process, opened on first use
+_store = None
+
+
+def get_prebuild_store():
+    global _store
+    if _store is None:
+        _store = PrebuildStore(PREBUILD_DB_PATH)
+    return _store
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Pre-generate the default reports of active merchants.")
+    parser.add_argument("--workers", type=int, default=PREBUILD_WORKERS)
+    parser.add_argument("--budget", type=float, default=PREBUILD_BUDGET_SECONDS, help="Seconds after which no build starts")
+    parser.add_argument("--history", action="store_true", help="Print the latest runs instead of building")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+
+    store = get_prebuild_store()
+    if args.history:
+        print(json.dumps(store.runs(), indent=2))
+        return 0
+    cache = ReportCache(
+        REPORT_CACHE_DIR,
+        max_entries=REPORT_CACHE_MAX_ENTRIES,
+        max_memory_bytes=REPORT_CACHE_MAX_MEMORY_BYTES,
+        max_disk_bytes=REPORT_CACHE_MAX_DISK_BYTES,
+        ttl=REPORT_CACHE_TTL
+    )
+    summary = run_prebuild(cache, store, args.workers, args.budget)
+    return 1 if summary["failed"] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,237 @@
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+
+
+@dataclass
+class CachedReport:
+    """A generated report PDF and the validators served with it."""
+    etag: str
+    last_modified: datetime
+    content: bytes
+
+
+def report_cache_key(merchant_id, window, watermark, variant=None):
+    """
+    Builds the cache key (also used as the ETag) of a report.
+    window identifies the reporting window, e.g. "30d@2025-06-20", and
+    watermark describes the merchant's data, e.g. its latest payment_date,
+    row count and row checksum. variant names the output format, e.g. the PDF backend.
+    A change to any of them produces a new key.
+    """
+    raw = json.dumps(
+        {"merchant_id": str(merchant_id), "window": window, "watermark": watermark, "variant": variant},
+        sort_keys=True,
+        default=str
+    )
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:32]
+
+
+class ReportCache:
+    """
+    Two-level cache of generated reports.
+    A bounded in-memory LRU sits in front of a bounded on-disk store.
+    Entries older than ttl seconds (or the ttl given to put) are treated
+    as missing on both levels.
+    Disk eviction works from an in-memory index of the entries' sizes and
+    expiry. The directory is only scanned when the cache is opened and
+    every rescan_interval seconds, to pick up entries other processes wrote.
+    """
+
+    def __init__(self, cache_dir, max_entries=128, max_memory_bytes=256 * 1024 * 1024,
+                 max_disk_bytes=2 * 1024 * 1024 * 1024, ttl=3600, rescan_interval=600):
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self.max_memory_bytes = max_memory_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self.ttl = ttl
+        self.rescan_interval = rescan_interval
+        self._memory = OrderedDict()
+        self._memory_bytes = 0
+        # key -> (size, expires), least recently used first
+        self._disk = OrderedDict()
+        self._disk_bytes = 0
+        self._scanned_at = 0
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+        self._scan_disk()
+
+    def get(self, key):
+        """
+        Returns the CachedReport stored under key, or None.
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                expires, report = entry
+                if now <= expires:
+                    self._memory.move_to_end(key)
+                    return report
+                self._drop_memory(key)
+
+        report, expires = self._read_disk(key, now)
+        if report is not None:
+            with self._lock:
+                self._put_memory(key, report, expires)
+        return report
+
+    def put(self, key, content, last_modified, ttl=None):
+        """
+        Stores a report PDF under key and returns its CachedReport.
+        ttl overrides the cache's ttl for this entry, e.g. for reports
+        built ahead of the day they are requested.
+        """
+        return self.put_many({key: content}, last_modified, ttl)[0]
+
+    def put_many(self, contents, last_modified, ttl=None):
+        """
+        Stores several entries (a dict of key to content) with the same
+        last_modified and ttl, evicting from disk once for the whole batch.
+        Returns their CachedReports in the same order.
+        """
+        created = time.time()
+        expires = created + (self.ttl if ttl is None else ttl)
+        reports = []
+        for key, content in contents.items():
+            report = CachedReport(etag=key, last_modified=last_modified, content=content)
+            with self._lock:
+                self._put_memory(key, report, expires)
+            self._write_disk(key, report, created, expires)
+            reports.append(report)
+        self._evict_disk()
+        return reports
+
+    # In-memory level (callers hold the lock)
+    def _put_memory(self, key, report, expires):
+        if key in self._memory:
+            self._drop_memory(key)
+        if len(report.content) > self.max_memory_bytes:
+            return
+        self._memory[key] = (expires, report)
+        self._memory_bytes += len(report.content)
+        while len(self._memory) > self.max_entries or self._memory_bytes > self.max_memory_bytes:
+            self._drop_memory(next(iter(self._memory)))
+
+    def _drop_memory(self, key):
+        _, report = self._memory.pop(key)
+        self._memory_bytes -= len(report.content)
+
+    # On-disk level, one PDF plus a small JSON sidecar per entry
+    def _paths(self, key):
+        base = os.path.join(self.cache_dir, key)
+        return base + ".pdf", base + ".json"
+
+    def _expires(self, meta):
+        # Entries written without their own expiry use the cache's ttl
+        return meta.get("expires", meta["created"] + self.ttl)
+
+    def _read_disk(self, key, now):
+        pdf_path, meta_path = self._paths(key)
+        try:
+            with open(meta_path) as f:
+                meta = json.load(f)
+            if now > self._expires(meta):
+                self._remove_disk(key)
+                return None, None
+            with open(pdf_path, "rb") as f:
+                content = f.read()
+            last_modified = datetime.fromisoformat(meta["last_modified"])
+            # Touch the entry so disk eviction stays least-recently-used,
+            # also for the index rebuilt by the next scan. Another thread or
+            # process may have evicted it since the read, which is a miss.
+            os.utime(meta_path)
+        except (OSError, ValueError, KeyError):
+            return None, None
+        with self._lock:
+            self._index_disk(key, len(content), self._expires(meta))
+        report = CachedReport(etag=key, last_modified=last_modified, content=content)
+        return report, self._expires(meta)
+
+    def _replace(self, path, data):
+        # Each writer gets its own temp file, so two writers of one key never mix their bytes
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, prefix=os.path.basename(path) + ".", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+
+    def _write_disk(self, key, report, created, expires):
+        pdf_path, meta_path = self._paths(key)
+        self._replace(pdf_path, report.content)
+        # The sidecar is replaced atomically too, eviction may read it at any time
+        meta = {"created": created, "expires": expires, "last_modified": report.last_modified.isoformat()}
+        self._replace(meta_path, json.dumps(meta).encode("utf-8"))
+        with self._lock:
+            self._index_disk(key, len(report.content), expires)
+
+    def _remove_disk(self, key):
+        with self._lock:
+            self._unindex_disk(key)
+        for path in self._paths(key):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    # Disk index (callers hold the lock)
+    def _index_disk(self, key, size, expires):
+        self._unindex_disk(key)
+        self._disk[key] = (size, expires)
+        self._disk_bytes += size
+
+    def _unindex_disk(self, key):
+        entry = self._disk.pop(key, None)
+        if entry is not None:
+            self._disk_bytes -= entry[0]
+
+    def _scan_disk(self):
+        # Rebuilds the index from the directory, least recently used first
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(".json"):
+                continue
+            key = name[:-len(".json")]
+            pdf_path, meta_path = self._paths(key)
+            try:
+                size = os.path.getsize(pdf_path)
+                used = os.path.getmtime(meta_path)
+                with open(meta_path) as f:
+                    expires = self._expires(json.load(f))
+            except (OSError, ValueError, KeyError):
+                continue
+            entries.append((used, key, size, expires))
+        with self._lock:
+            self._disk.clear()
+            self._disk_bytes = 0
+            for used, key, size, expires in sorted(entries):
+                self._index_disk(key, size, expires)
+            self._scanned_at = time.time()
+
+    def _evict_disk(self):
+        now = time.time()
+        if now - self._scanned_at > self.rescan_interval:
+            self._scan_disk()
+        with self._lock:
+            # Expired entries, then least recently used until under budget
+            victims = [key for key, (size, expires) in self._disk.items() if now > expires]
+            for key in victims:
+                self._unindex_disk(key)
+            while self._disk_bytes > self.max_disk_bytes and self._disk:
+                key = next(iter(self._disk))
+                self._unindex_disk(key)
+                victims.append(key)
+        for key in victims:
+            self._remove_disk(key)
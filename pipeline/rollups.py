@@ -0,0 +1,305 @@
+from contextlib import closing
+from datetime import datetime, timedelta
+import argparse
+import os
+import sqlite3
+import sys
+import pandas as pd
+
+# Add the root directory to sys.path
+root_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(root_path)
+from database.engine import get_engine
+from database.queries import fetch_rollup_source
+from database.schema import to_amount
+from pipeline.sketches import UserSketch
+from config import ROLLUP_DB_PATH
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS daily_rollup (
+    merchant_id TEXT NOT NULL,
+    day TEXT NOT NULL,
+    paid_amount_cents INTEGER NOT NULL,
+    transactions INTEGER NOT NULL,
+    fee_cents INTEGER NOT NULL,
+    commission_amount_cents INTEGER NOT NULL,
+    users INTEGER NOT NULL,
+    new_users INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (merchant_id, day)
+);
+CREATE TABLE IF NOT EXISTS daily_status (
+    merchant_id TEXT NOT NULL,
+    day TEXT NOT NULL,
+    status TEXT NOT NULL,
+    transactions INTEGER NOT NULL,
+    PRIMARY KEY (merchant_id, day, status)
+);
+CREATE TABLE IF NOT EXISTS daily_user_sketch (
+    merchant_id TEXT NOT NULL,
+    day TEXT NOT NULL,
+    sketch BLOB NOT NULL,
+    PRIMARY KEY (merchant_id, day)
+);
+CREATE TABLE IF NOT EXISTS user_first_seen (
+    merchant_id TEXT NOT NULL,
+    user_id INTEGER NOT NULL,
+    first_day TEXT NOT NULL,
+    PRIMARY KEY (merchant_id, user_id)
+);
+CREATE INDEX IF NOT EXISTS user_first_seen_day ON user_first_seen (merchant_id, first_day);
+CREATE TABLE IF NOT EXISTS rollup_state (
+    name TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+# Everything before this is loaded on the first refresh
+EPOCH = datetime(1970, 1, 1)
+
+# Stores whose daily_rollup lacks this column hold money as REAL amounts and
+# no new-user counts, and are rebuilt from scratch
+LAYOUT_COLUMN = "new_users"
+TABLES = ["daily_rollup", "daily_status", "daily_user_sketch", "user_first_seen", "rollup_state"]
+
+
+def aggregate_daily(transactions):
+    """
+    Folds raw transactions into per (merchant_id, day) rollups and
+    per (merchant_id, day, status) counts. Money is summed and stored in
+    cents.
+    """
+    day = transactions['payment_date'].dt.date.rename('day')
+    merchant_id = transactions['merchant_id'].astype(str)
+    daily = transactions.groupby([merchant_id, day]).agg(
+        paid_amount=('paid_amount', 'sum'),
+        transactions=('payment_date', 'size'),
+        fee=('fee', 'sum'),
+        commission_amount=('commission_amount', 'sum'),
+        users=('user_id', 'nunique')
+    ).reset_index()
+    status = transactions.groupby([merchant_id, day, transactions['status']], observed=True).size()
+    status = status.rename('transactions').reset_index()
+    return daily, status
+
+
+def daily_user_sketches(transactions):
+    """
+    Builds one distinct-user sketch per (merchant_id, day), returned as
+    (merchant_id, day, serialized sketch) rows.
+    """
+    users = transactions.dropna(subset=['user_id'])
+    day = users['payment_date'].dt.date
+    merchant_id = users['merchant_id'].astype(str)
+    return [
+        (merchant, bucket, UserSketch.from_ids(rows.to_numpy(dtype='int64')).to_bytes())
+        for (merchant, bucket), rows in users['user_id'].groupby([merchant_id, day])
+    ]
+
+
+def first_seen_days(transactions):
+    """
+    Returns each (merchant_id, user_id)'s first payment day in transactions,
+    as (merchant_id, user_id, day) rows.
+    """
+    users = transactions.dropna(subset=['user_id'])
+    day = users['payment_date'].dt.date
+    merchant_id = users['merchant_id'].astype(str)
+    first = day.groupby([merchant_id, users['user_id'].astype('int64')]).min()
+    return [(merchant, int(user_id), bucket.isoformat()) for (merchant, user_id), bucket in first.items()]
+
+
+class RollupStore:
+    """
+    Local per-merchant daily rollups of the report view, kept in SQLite,
+    with a distinct-user sketch per merchant and day and every user's
+    first payment day per merchant, so new users are counted exactly.
+    Each day's rollup keeps its count of new users, so user totals are sums
+    over days rather than scans of the users.
+    refresh() re-aggregates only the days from the stored payment_date
+    watermark onwards, so each run reads the new rows and not the history.
+    """
+
+    def __init__(self, path=ROLLUP_DB_PATH):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with closing(self._connect()) as db, db:
+            columns = [row[1] for row in db.execute("PRAGMA table_info(daily_rollup)")]
+            if columns and LAYOUT_COLUMN not in columns:
+                for table in TABLES:
+                    db.execute(f"DROP TABLE IF EXISTS {table}")
+            db.executescript(SCHEMA)
+
+    def _connect(self):
+        return sqlite3.connect(self.path)
+
+    def watermark(self):
+        """
+        Returns the latest payment_date folded into the store, or None.
+        """
+        with closing(self._connect()) as db:
+            row = db.execute("SELECT value FROM rollup_state WHERE name = 'watermark'").fetchone()
+        return datetime.fromisoformat(row[0]) if row else None
+
+    def refresh(self, conn):
+        """
+        Brings the rollups up to date from the report view on conn.
+        The watermark's whole day is re-read so late rows for that day are
+        not lost. Returns the number of source rows read.
+        """
+        watermark = self.watermark()
+        since = datetime.combine(watermark.date(), datetime.min.time()) if watermark else EPOCH
+        with closing(self._connect()) as db:
+            # Stores filled before first-seen days were kept are rebuilt from scratch
+            if not db.execute("SELECT 1 FROM user_first_seen LIMIT 1").fetchone():
+                since = EPOCH
+        transactions = fetch_rollup_source(conn, since)
+        if transactions.empty:
+            return 0
+
+        daily, status = aggregate_daily(transactions)
+        sketches = daily_user_sketches(transactions)
+        first_seen = first_seen_days(transactions)
+        since_day = since.date().isoformat()
+        new_watermark = transactions['payment_date'].max().to_pydatetime()
+
+        with closing(self._connect()) as db, db:
+            # Replace every day from the re-read point onwards
+            db.execute("DELETE FROM daily_rollup WHERE day >= ?", (since_day,))
+            db.execute("DELETE FROM daily_status WHERE day >= ?", (since_day,))
+            db.execute("DELETE FROM daily_user_sketch WHERE day >= ?", (since_day,))
+            db.execute("DELETE FROM user_first_seen WHERE first_day >= ?", (since_day,))
+            db.executemany(
+                "INSERT INTO daily_rollup VALUES (?, ?, ?, ?, ?, ?, ?, 0)",
+                [
+                    (row.merchant_id, row.day.isoformat(), int(row.paid_amount), int(row.transactions),
+                     int(row.fee), int(row.commission_amount), int(row.users))
+                    for row in daily.itertuples(index=False)
+                ]
+            )
+            db.executemany(
+                "INSERT INTO daily_status VALUES (?, ?, ?, ?)",
+                [
+                    (row.merchant_id, row.day.isoformat(), row.status, int(row.transactions))
+                    for row in status.itertuples(index=False)
+                ]
+            )
+            db.executemany(
+                "INSERT INTO daily_user_sketch VALUES (?, ?, ?)",
+                [(merchant, day.isoformat(), sketch) for merchant, day, sketch in sketches]
+            )
+            # Users seen before the re-read point keep their earlier first day
+            db.executemany(
+                "INSERT INTO user_first_seen VALUES (?, ?, ?) "
+                "ON CONFLICT (merchant_id, user_id) DO UPDATE SET first_day = MIN(first_day, excluded.first_day)",
+                first_seen
+            )
+            # First days before the re-read point did not move, so only the re-read days change
+            db.execute(
+                "UPDATE daily_rollup SET new_users = (SELECT COUNT(*) FROM user_first_seen "
+                "WHERE user_first_seen.merchant_id = daily_rollup.merchant_id "
+                "AND user_first_seen.first_day = daily_rollup.day) WHERE day >= ?",
+                (since_day,)
+            )
+            db.execute(
+                "INSERT OR REPLACE INTO rollup_state VALUES ('watermark', ?)",
+                (new_watermark.isoformat(),)
+            )
+        return len(transactions)
+
+    def load(self, merchant_id, start, end):
+        """
+        Reads one merchant's rollups for the days of the [start, end) window.
+        Returns the daily frame (indexed by day, with paid_amount,
+        transactions and users columns), the status counts and the window's
+        paid_amount, fee and commission_amount totals.
+        """
+        # end is exclusive, so a window ending at midnight stops the day before
+        last_day = (end - timedelta(microseconds=1)).date()
+        params = (str(merchant_id), start.date().isoformat(), last_day.isoformat())
+        with closing(self._connect()) as db:
+            daily = pd.read_sql(
+                "SELECT day, paid_amount_cents, transactions, fee_cents, commission_amount_cents, users "
+                "FROM daily_rollup "
+                "WHERE merchant_id = ? AND day >= ? AND day <= ? ORDER BY day",
+                db,
+                params=params
+            )
+            status = pd.read_sql(
+                "SELECT status, SUM(transactions) AS count FROM daily_status "
+                "WHERE merchant_id = ? AND day >= ? AND day <= ? "
+                "GROUP BY status ORDER BY count DESC",
+                db,
+                params=params
+            )
+        daily['day'] = pd.to_datetime(daily['day']).dt.date
+        daily = daily.set_index('day')
+        # Totals are summed in cents, so they are exact
+        totals = {
+            column: to_amount(daily[f'{column}_cents'].sum())
+            for column in ('paid_amount', 'fee', 'commission_amount')
+        }
+        daily['paid_amount'] = to_amount(daily['paid_amount_cents'])
+        return daily[['paid_amount', 'transactions', 'users']], status.set_index('status')['count'], totals
+
+    def load_user_counts(self, merchant_id, start, end):
+        """
+        One merchant's distinct-user counts for the days of the [start, end)
+        window. total_users and new_users (first payment in the window) are
+        exact, summed from the daily new-user counts. window_users merges the window's
+        daily sketches, so past SKETCH_EXACT_LIMIT users it carries the
+        HyperLogLog error, and so does returning_users (window_users minus
+        new_users).
+        """
+        first_day = start.date().isoformat()
+        last_day = (end - timedelta(microseconds=1)).date().isoformat()
+        params = (str(merchant_id), first_day, last_day)
+        window = UserSketch()
+        with closing(self._connect()) as db:
+            rows = db.execute(
+                "SELECT sketch FROM daily_user_sketch WHERE merchant_id = ? AND day >= ? AND day <= ?",
+                params
+            )
+            for (sketch,) in rows:
+                window.merge(UserSketch.from_bytes(sketch))
+            new_users, total_users = db.execute(
+                "SELECT SUM(CASE WHEN day >= ? AND day <= ? THEN new_users ELSE 0 END), SUM(new_users) "
+                "FROM daily_rollup WHERE merchant_id = ?",
+                (first_day, last_day, str(merchant_id))
+            ).fetchone()
+        new_users = new_users or 0
+        total_users = total_users or 0
+        # Every new user paid in the window, so the estimate never goes below them
+        window_users = max(window.count(), new_users)
+        return {
+            "window_users": window_users,
+            "new_users": new_users,
+            "returning_users": window_users - new_users,
+            "total_users": total_users
+        }
+
+
+# One store per process, opened on first use
+_store = None
+
+
+def get_rollup_store():
+    global _store
+    if _store is None:
+        _store = RollupStore(ROLLUP_DB_PATH)
+    return _store
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Refresh the per-merchant daily rollup store.")
+    parser.add_argument("--path", default=ROLLUP_DB_PATH, help="SQLite file holding the rollups")
+    args = parser.parse_args(argv)
+
+    store = RollupStore(args.path)
+    with get_engine().connect() as conn:
+        rows = store.refresh(conn)
+    print(f"Rollups refreshed from {rows} rows, watermark {store.watermark()}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+import asyncio
+import os
+import sys
+
+# Add the root directory to sys.path
+root_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(root_path)
+from pipeline.instrumentation import COALESCED_REQUESTS
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls that share a key into one execution.
+    The first caller for a key starts the work as a task, and callers that
+    arrive while it is in flight await the same task and get its result or
+    its exception. A caller that is cancelled only stops waiting: the shared
+    task keeps running for the others, so its result (e.g. a report written
+    to the cache) is not wasted.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self._inflight = {}
+
+    def __len__(self):
+        return len(self._inflight)
+
+    async def run(self, key, work):
+        """
+        Returns the result of work() for key, running it only if no call
+        with the same key is already in flight. work is an async callable.
+        """
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(work())
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._finish(key, done))
+        else:
+            COALESCED_REQUESTS.labels(endpoint=self.name).inc()
+        return await asyncio.shield(task)
+
+    def _finish(self, key, task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # Mark the error as retrieved even when every waiter has gone
+        if not task.cancelled():
+            task.exception()
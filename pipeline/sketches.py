@@ -0,0 +1,134 @@
+import os
+import sys
+import numpy as np
+
+# Add the root directory to sys.path
+root_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(root_path)
+from config import SKETCH_PRECISION, SKETCH_EXACT_LIMIT
+
+_EXACT = b"E"
+_HLL = b"H"
+
+
+def _hash(user_ids):
+    # splitmix64 finaliser: spreads sequential ids over all 64 bits
+    x = np.asarray(user_ids, dtype=np.uint64).copy()
+    with np.errstate(over="ignore"):
+        x += np.uint64(0x9E3779B97F4A7C15)
+        x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+
+def _bit_length(values):
+    # Exact bit length of uint64 values, computed on 32-bit halves so floats stay exact
+    high = (values >> np.uint64(32)).astype(np.float64)
+    low = (values & np.uint64(0xFFFFFFFF)).astype(np.float64)
+    return np.where(high > 0, 32 + np.frexp(high)[1], np.frexp(low)[1])
+
+
+class UserSketch:
+    """
+    Mergeable distinct count of user ids.
+    Small sets are kept exactly, as sorted ids. Past exact_limit ids the
+    sketch switches to a HyperLogLog with 2**precision registers (about
+    1.04 / sqrt(2**precision) relative error, 0.8% at the default 14).
+    """
+
+    def __init__(self, precision=SKETCH_PRECISION, exact_limit=SKETCH_EXACT_LIMIT):
+        self.precision = precision
+        self.exact_limit = exact_limit
+        self.ids = np.empty(0, dtype=np.int64)
+        self.registers = None
+
+    @classmethod
+    def from_ids(cls, user_ids, **kwargs):
+        sketch = cls(**kwargs)
+        sketch.add(user_ids)
+        return sketch
+
+    @property
+    def exact(self):
+        return self.registers is None
+
+    def add(self, user_ids):
+        user_ids = np.asarray(user_ids, dtype=np.int64)
+        if self.exact:
+            self.ids = np.union1d(self.ids, user_ids)
+            if len(self.ids) > self.exact_limit:
+                self._to_hll()
+        else:
+            self._add_hll(user_ids)
+        return self
+
+    def _to_hll(self):
+        self.registers = np.zeros(1 << self.precision, dtype=np.uint8)
+        self._add_hll(self.ids)
+        self.ids = np.empty(0, dtype=np.int64)
+
+    def _add_hll(self, user_ids):
+        hashed = _hash(user_ids)
+        index = (hashed >> np.uint64(64 - self.precision)).astype(np.int64)
+        rest = hashed & np.uint64((1 << (64 - self.precision)) - 1)
+        # Position of the first set bit after the index bits
+        rank = (64 - self.precision + 1 - _bit_length(rest)).astype(np.uint8)
+        np.maximum.at(self.registers, index, rank)
+
+    def merge(self, other):
+        """
+        Adds every user of other to this sketch and returns it.
+        """
+        if other.exact:
+            return self.add(other.ids)
+        if other.precision != self.precision:
+            raise ValueError("Cannot merge sketches of different precision.")
+        if self.exact:
+            ids = self.ids
+            self.registers = other.registers.copy()
+            self.ids = np.empty(0, dtype=np.int64)
+            self._add_hll(ids)
+        else:
+            np.maximum(self.registers, other.registers, out=self.registers)
+        return self
+
+    def count(self):
+        """
+        Returns the number of distinct users, exact below exact_limit.
+        """
+        if self.exact:
+            return len(self.ids)
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / np.sum(np.ldexp(1.0, -self.registers.astype(np.int64)))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if estimate <= 2.5 * m and zeros:
+            # Linear counting is more accurate while many registers are empty
+            estimate = m * np.log(m / zeros)
+        return int(round(estimate))
+
+    def to_bytes(self):
+        if self.exact:
+            return _EXACT + self.ids.astype("<i8").tobytes()
+        return _HLL + bytes([self.precision]) + self.registers.tobytes()
+
+    @classmethod
+    def from_bytes(cls, data, exact_limit=SKETCH_EXACT_LIMIT):
+        if data[:1] == _EXACT:
+            sketch = cls(exact_limit=exact_limit)
+            sketch.ids = np.frombuffer(data[1:], dtype="<i8").astype(np.int64)
+            return sketch
+        sketch = cls(precision=data[1], exact_limit=exact_limit)
+        sketch.registers = np.frombuffer(data[2:], dtype=np.uint8).copy()
+        return sketch
+
+
+def merge_sketches(sketches, **kwargs):
+    """
+    Merges any number of sketches into a new one.
+    """
+    merged = UserSketch(**kwargs)
+    for sketch in sketches:
+        merged.merge(sketch)
+    return merged
+
@@ -0,0 +1,318 @@
+from datetime import datetime
+import argparse
+import glob
+import json
+import os
+import sys
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# Add the root directory to sys.path
+root_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(root_path)
+from database.engine import get_engine
+from database.queries import fetch_snapshot_source
+from database.schema import REPORT_SCHEMA, conform_report_frame
+from pipeline.windows import time_slice
+from config import SNAPSHOT_DIR, TOP_STATES
+
+# Everything before this is exported on the first refresh
+EPOCH = datetime(1970, 1, 1)
+
+PARTITION_FILE = "data.parquet"
+USERS_FILE = "users.parquet"
+
+
+def _month(timestamp):
+    return timestamp.strftime("%Y-%m")
+
+
+def _merchant_dir(merchant_id):
+    # The id becomes a directory name, so anything but a whole number (e.g. "*" or "../x") is rejected
+    try:
+        return f"merchant_id={int(merchant_id)}"
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid merchant_id: {merchant_id!r}")
+
+
+def _months(start, end):
+    # Months overlapping the [start, end) window
+    return [period.strftime("%Y-%m") for period in pd.period_range(start, end, freq="M")]
+
+
+class ReportSnapshot:
+    """
+    Local copy of the report view in Parquet, one file per merchant and month
+    under <root>/merchant_id=<id>/month=<YYYY-MM>/. refresh() exports only the
+    rows from the stored payment_date watermark onwards and rewrites the
+    partitions they fall in. Partitions are read with memory mapping.
+    refresh() also keeps each merchant's users (first payment and state) in
+    <root>/merchant_id=<id>/users.parquet, and the platform totals and
+    per-merchant user totals and state distributions in the state file,
+    so a report never reads a merchant's whole history.
+    """
+
+    def __init__(self, root=SNAPSHOT_DIR):
+        self.root = root
+        self._state = None
+        self._state_mtime = None
+        os.makedirs(root, exist_ok=True)
+
+    def _state_path(self):
+        return os.path.join(self.root, "_state.json")
+
+    def _partition_path(self, merchant_id, month):
+        return os.path.join(self.root, _merchant_dir(merchant_id), f"month={month}", PARTITION_FILE)
+
+    def _partitions(self, merchant_id=None, month="*"):
+        # Every merchant's partitions when merchant_id is None
+        merchant_dir = "merchant_id=*" if merchant_id is None else _merchant_dir(merchant_id)
+        return sorted(glob.glob(os.path.join(self.root, merchant_dir, f"month={month}", PARTITION_FILE)))
+
+    def _users_path(self, merchant_id):
+        return os.path.join(self.root, _merchant_dir(merchant_id), USERS_FILE)
+
+    def _read_state(self):
+        # Parsed once per refresh, re-read only when the file changes
+        try:
+            mtime = os.stat(self._state_path()).st_mtime_ns
+            if mtime != self._state_mtime:
+                with open(self._state_path()) as f:
+                    self._state = json.load(f)
+                self._state_mtime = mtime
+        except (OSError, ValueError):
+            return {}
+        return self._state
+
+    def _write_state(self, state):
+        tmp_path = self._state_path() + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(state, f)
+        os.replace(tmp_path, self._state_path())
+        self._state, self._state_mtime = state, os.stat(self._state_path()).st_mtime_ns
+
+    def watermark(self):
+        """
+        Returns the latest payment_date exported to the snapshot, or None.
+        """
+        try:
+            return datetime.fromisoformat(self._read_state()["watermark"])
+        except (ValueError, KeyError):
+            return None
+
+    def _read(self, paths, columns=None):
+        tables = [pq.read_table(path, columns=columns, memory_map=True) for path in paths]
+        if not tables:
+            frame = pd.DataFrame({column: pd.Series(dtype=dtype) for column, dtype in REPORT_SCHEMA.items()})
+            return frame[columns] if columns else frame
+        # Categories differ between partitions, so concatenate before converting
+        frame = pa.concat_tables(tables, promote_options="permissive").to_pandas()
+        schema = {column: REPORT_SCHEMA[column] for column in frame.columns}
+        return conform_report_frame(frame, schema)
+
+    def _write(self, path, frame):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + ".tmp"
+        frame.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, path)
+
+    def _read_users(self, merchant_id, before=None):
+        # user_id, first_payment and state of one merchant's users, only
+        # those first seen before `before` when given
+        path = self._users_path(merchant_id)
+        if not os.path.exists(path):
+            return pd.DataFrame({
+                "user_id": pd.Series(dtype="int64"),
+                "first_payment": pd.Series(dtype="datetime64[ns]"),
+                "state": pd.Series(dtype="object")
+            })
+        filters = [("first_payment", "<", pd.Timestamp(before))] if before is not None else None
+        return pq.read_table(path, filters=filters, memory_map=True).to_pandas()
+
+    def _update_users(self, merchant_id, rows):
+        # Folds new rows into the merchant's users, keeping each user's
+        # earliest payment and first state by name, and returns them
+        users = _fold_users(pd.concat([self._read_users(merchant_id), _users(rows)], ignore_index=True))
+        self._write(self._users_path(merchant_id), users)
+        return users
+
+    def refresh(self, conn):
+        """
+        Brings the snapshot up to date from the report view on conn.
+        The watermark's whole day is re-read so late rows for that day are
+        not lost. Returns the number of source rows read.
+        """
+        state = self._read_state()
+        watermark = self.watermark()
+        since = datetime.combine(watermark.date(), datetime.min.time()) if watermark else EPOCH
+        # Snapshots written before the user aggregates were kept are exported again
+        if "merchants" not in state:
+            since = EPOCH
+        transactions = fetch_snapshot_source(conn, since)
+        if transactions.empty:
+            return 0
+
+        # Every partition from the re-read month onwards, plus the ones new rows land in
+        month = transactions['payment_date'].dt.strftime("%Y-%m")
+        groups = dict(list(transactions.groupby([transactions['merchant_id'], month])))
+        touched = {
+            (merchant_id, partition_month)
+            for merchant_id, partition_month in groups
+        }
+        for path in self._partitions():
+            merchant_dir, month_dir = path.split(os.sep)[-3:-1]
+            partition_month = month_dir.split("=", 1)[1]
+            if partition_month >= _month(since):
+                touched.add((int(merchant_dir.split("=", 1)[1]), partition_month))
+
+        for merchant_id, partition_month in touched:
+            path = self._partition_path(merchant_id, partition_month)
+            kept = self._read([path]) if os.path.exists(path) else None
+            if kept is not None:
+                kept = kept[kept['payment_date'] < since]
+            new_rows = groups.get((merchant_id, partition_month))
+            frames = [frame for frame in (kept, new_rows) if frame is not None and not frame.empty]
+            if frames:
+                merged = conform_report_frame(pd.concat(frames, ignore_index=True))
+                self._write(path, merged.sort_values("payment_date"))
+            elif os.path.exists(path):
+                os.remove(path)
+
+        # Users and platform totals, so reports need neither the history nor every footer
+        merchants = {} if since == EPOCH else dict(state.get("merchants", {}))
+        for merchant_id, rows in transactions.groupby('merchant_id'):
+            users = self._update_users(merchant_id, rows)
+            merchants[str(int(merchant_id))] = {
+                "total_users": len(users),
+                "user_state_dist": [
+                    [str(name), int(count)] for name, count in users['state'].dropna().value_counts().items()
+                ]
+            }
+        self._write_state({
+            "watermark": transactions['payment_date'].max().to_pydatetime().isoformat(),
+            "platform_totals": {
+                "total_rows": sum(pq.ParquetFile(path).metadata.num_rows for path in self._partitions())
+            },
+            "merchants": merchants
+        })
+        return len(transactions)
+
+    def platform_totals(self):
+        """
+        Returns the platform totals counted at the last refresh.
+        """
+        return self._read_state().get("platform_totals", {"total_rows": 0})
+
+    def _merchant_aggregates(self, merchant_id):
+        aggregates = self._read_state().get("merchants", {}).get(str(int(merchant_id)), {})
+        states = aggregates.get("user_state_dist", [])
+        user_state_dist = pd.Series(
+            [count for _, count in states],
+            index=pd.Index([name for name, _ in states], name="state"),
+            name="users",
+            dtype="int64"
+        )
+        return aggregates.get("total_users", 0), user_state_dist
+
+    def _returning_users(self, merchant_id, transactions, start):
+        # Users of the window whose first payment was before it
+        seen_before = self._read_users(merchant_id, before=start)['user_id']
+        return int(transactions['user_id'][transactions['user_id'].isin(seen_before)].nunique())
+
+    def load_report_data(self, merchant_id, start, end):
+        """
+        Snapshot counterpart of database.queries.load_report_data. Only the
+        months of the window are read from the merchant's partitions; user
+        totals and states come from the aggregates kept at refresh time.
+        """
+        months = _months(start, end)
+        transactions = self._read([
+            path for month in months for path in self._partitions(merchant_id, month)
+        ])
+        transactions = time_slice(transactions, start, end)
+
+        total_users, user_state_dist = self._merchant_aggregates(merchant_id)
+        return {
+            "transactions": transactions,
+            "total_users": total_users,
+            "returning_users": self._returning_users(merchant_id, transactions, start),
+            "user_state_dist": user_state_dist.head(TOP_STATES),
+            "platform_totals": self.platform_totals()
+        }
+
+    def load_batch_data(self, start, end, merchant_ids=None):
+        """
+        Snapshot counterpart of database.queries.load_batch_data.
+        """
+        selected = merchant_ids or [None]
+        months = _months(start, end)
+        transactions = self._read([
+            path for merchant_id in selected for month in months
+            for path in self._partitions(merchant_id, month)
+        ])
+        transactions = time_slice(transactions, start, end)
+
+        if merchant_ids is None:
+            merchant_ids = [int(merchant_id) for merchant_id in self._read_state().get("merchants", {})]
+        total_users, user_state_dist = {}, {}
+        for merchant_id in merchant_ids:
+            total_users[int(merchant_id)], user_state_dist[int(merchant_id)] = self._merchant_aggregates(merchant_id)
+        returning_users = {
+            merchant_id: self._returning_users(merchant_id, rows, start)
+            for merchant_id, rows in transactions.groupby('merchant_id')
+        }
+        states = [dist for dist in user_state_dist.values() if not dist.empty]
+        return {
+            "transactions": transactions.reset_index(drop=True),
+            "total_users": total_users,
+            "returning_users": returning_users,
+            "user_state_dist": pd.concat(
+                {merchant_id: dist for merchant_id, dist in user_state_dist.items() if not dist.empty},
+                names=["merchant_id", "state"]
+            ) if states else pd.Series(dtype="int64"),
+            "platform_totals": self.platform_totals()
+        }
+
+
+def _users(rows):
+    # One row per user of rows: first payment and first non-null state by name
+    rows = rows.dropna(subset=['user_id'])
+    return _fold_users(pd.DataFrame({
+        "user_id": rows['user_id'].astype("int64"),
+        "first_payment": rows['payment_date'],
+        "state": rows['state'].astype(object)
+    }))
+
+
+def _fold_users(users):
+    # Null states are skipped, as MIN(state) does in the SQL path
+    first_payment = users.groupby("user_id")['first_payment'].min()
+    named = users.dropna(subset=['state'])
+    state = named['state'].astype(str).groupby(named['user_id']).min()
+    return pd.DataFrame({"first_payment": first_payment, "state": state.reindex(first_payment.index)}).reset_index()
+
+
+# One snapshot per process, opened on first use
+_snapshot = None
+
+
+def get_snapshot():
+    global _snapshot
+    if _snapshot is None:
+        _snapshot = ReportSnapshot(SNAPSHOT_DIR)
+    return _snapshot
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Refresh the local Parquet snapshot of the report view.")
+    parser.add_argument("--path", default=SNAPSHOT_DIR, help="Directory holding the snapshot")
+    args = parser.parse_args(argv)
+
+    snapshot = ReportSnapshot(args.path)
+    with get_engine().connect() as conn:
+        rows = snapshot.refresh(conn)
+    print(f"Snapshot refreshed from {rows} rows, watermark {snapshot.watermark()}")
+
+if __name__ == "__main__":
+    main()
@@ -1,53 +1,19 @@
-import pandas as pd
-import matplotlib.pyplot as plt
 import seaborn as sns
-from datetime import datetime, timedelta
-from matplotlib.patches import Rectangle
+from pipeline.page_template import new_page
 
-# Set style
-sns.set_style('whitegrid')
-
-# Load the merged DataFrame
-merged_df = pd.read_csv("Data/MOCK_DATA.csv")
-def transaction_status_analysis(merged_df, merchant_id):
+def transaction_status_analysis(status_metrics):
     """
-    This function analyzes transaction statuses in the last month,
-    calculates financial metrics, and creates a visualization of status distribution
+    This function draws transaction statuses in the report window,
+    the financial metrics, and a visualization of status distribution
     and financial breakdown.
+    All values come precomputed in status_metrics (see pipeline.metrics).
     """
-    # Convert payment_date to datetime
-    merged_df['payment_date'] = pd.to_datetime(merged_df['payment_date'])
-    merged_df = merged_df[merged_df['merchant_id'] == merchant_id]
-    # Filter for the last month
-    last_month_date = datetime.now() - timedelta(days=30)
-    filtered_df = merged_df[merged_df['payment_date'] >= last_month_date].copy()
-    
-    # Calculate metrics
-    filtered_df['net_revenue'] = filtered_df['paid_amount'] - filtered_df['fee'] - filtered_df['commission_amount']
-    status_counts = filtered_df['status'].value_counts()
+    status_counts = status_metrics.status_counts
     
-    # Create figure with surrounding box
-    fig = plt.figure(figsize=(8.27,11.69))
+    # Create page
+    fig = new_page(f'Transaction status Analysis - {status_metrics.window_title}', separator_y=0.50)
     gs = fig.add_gridspec(2, 2, height_ratios=[1, 1], width_ratios=[1.5, 1], hspace=0.3)
     
-    # Create surrounding box
-    box = Rectangle((0.01, 0.01), 0.98, 0.98, linewidth=2, edgecolor='black',
-                    facecolor='none', transform=fig.transFigure, zorder=-1)
-    fig.patches.extend([box])
-    
-    # Add horizontal separator line
-    separator_1 = Rectangle((0.01, 0.91), 0.98, 0.08, linewidth=1.5, edgecolor='black',
-                         facecolor='#b7cbbf', transform=fig.transFigure, zorder=-1)
-    fig.patches.extend([separator_1])
-    
-    # Add horizontal separator line
-    separator_2 = Rectangle((0.01, 0.50), 0.98, 0.002, linewidth=1.5, edgecolor='black',
-                         facecolor='none', transform=fig.transFigure, zorder=-1)
-    fig.patches.extend([separator_2])
-    
-    # Add title for the entire visualization
-    fig.suptitle('Transaction status Analysis - Last 30 Days', fontsize=18, y=0.96)
-    
     
     # --- Pie Chart (Top Left) ---
     ax_pie = fig.add_subplot(gs[0, 0])
@@ -108,10 +74,10 @@ def transaction_status_analysis(merged_df, merchant_id):
     
     # Prepare values
     financial_values = [
-        filtered_df['paid_amount'].sum(),
-        filtered_df['net_revenue'].sum(),
-        filtered_df['fee'].sum(),
-        filtered_df['commission_amount'].sum()
+        status_metrics.paid_amount,
+        status_metrics.net_revenue,
+        status_metrics.fee,
+        status_metrics.commission_amount
     ]
     financial_labels = ['Paid Amount', 'Net Revenue', 'Fee', 'Commission']
     
@@ -130,10 +96,16 @@ def transaction_status_analysis(merged_df, merchant_id):
                        ha='center', va='bottom',
                        fontsize=11)
     
-    # Save as PNG
-    plt.savefig('artifacts/financial_performance_analysis.png', dpi=300, bbox_inches='tight')
-    print("Visualization saved as 'financial_performance_analysis.png'")
+    # The caller decides where and how the page is saved
+    return fig
 
 if __name__ == "__main__":
-    transaction_status_analysis(merged_df, merchent_id=3)
+    import pandas as pd
+    from pipeline.metrics import metrics_from_frame
+    from pipeline.pages import load_plotting
+    from config import MOCK_DATA_PATH
+    load_plotting()
+    merged_df = pd.read_csv(MOCK_DATA_PATH)
+    fig = transaction_status_analysis(metrics_from_frame(merged_df, merchant_id=3).status)
+    fig.savefig('artifacts/financial_performance_analysis.png', dpi=300, bbox_inches='tight')
     print("Transaction status analysis completed successfully.")
\ No newline at end of file
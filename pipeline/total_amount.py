@@ -1,67 +1,34 @@
-import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
 import matplotlib.dates as mdates
-from datetime import datetime, timedelta
-from matplotlib.patches import Rectangle
+from pipeline.page_template import new_page, day_locator
 
-# Set style
-sns.set_style('whitegrid')
-
-# Load the merged DataFrame
-merged_df = pd.read_csv("Data/MOCK_DATA.csv")
-
-def total_amount_calc(merged_df, merchant_id):
+def total_amount_calc(amount_metrics):
     """
-    This function calculates the total amount paid in the last month,
-    average daily paid amount, highest day with its amount, and creates a
+    This function draws the total amount paid in the report window,
+    average daily paid amount, highest day with its amount, and a
     visualization of daily paid amounts with KPIs.
+    All values come precomputed in amount_metrics (see pipeline.metrics).
     """
-    # Convert payment_date to datetime and filter last month
-    merged_df['payment_date'] = pd.to_datetime(merged_df['payment_date'])
-    merged_df = merged_df[merged_df['merchant_id'] == merchant_id]
-    last_month_start = datetime.now() - timedelta(days=30)
-    last_month = merged_df[merged_df['payment_date'] >= last_month_start]
-    
-    # Calculate KPIs
-    total_paid_last_month = last_month['paid_amount'].sum()
-    avg_daily_paid = last_month.groupby(last_month['payment_date'].dt.date)['paid_amount'].sum().mean()
-    max_day = last_month.groupby(last_month['payment_date'].dt.date)['paid_amount'].sum().idxmax()
-    max_amount = last_month.groupby(last_month['payment_date'].dt.date)['paid_amount'].sum().max()
-    
-    # Create daily paid amounts series
-    daily_paid = last_month.groupby(last_month['payment_date'].dt.date)['paid_amount'].sum()
-    
-    # Create figure with subplots
-    fig = plt.figure(figsize=(8.27,11.69))
+    total_paid_last_month = amount_metrics.total_paid
+    avg_daily_paid = amount_metrics.avg_daily_paid
+    max_day = amount_metrics.max_day
+    max_amount = amount_metrics.max_amount
+    daily_paid = amount_metrics.daily_paid
+    
+    # Create page with subplots
+    fig = new_page(f'Payment Analysis - {amount_metrics.window_title}', separator_y=0.70)
     gs = fig.add_gridspec(2, 1, height_ratios=[1, 3], hspace=0.3)
     
     # Create axes
     ax_table = fig.add_subplot(gs[0])
     ax_chart = fig.add_subplot(gs[1])
     
-    # Create a surrounding box for both elements
-    box = Rectangle((0.01, 0.01), 0.98, 0.98, linewidth=2, edgecolor='black', facecolor='none',
-                    transform=fig.transFigure, zorder=-1)
-    fig.patches.extend([box])
-    
-    # Add horizontal separator line
-    separator_1 = Rectangle((0.01, 0.91), 0.98, 0.08, linewidth=1.5, edgecolor='black',
-                         facecolor='#b7cbbf', transform=fig.transFigure, zorder=-1)
-    fig.patches.extend([separator_1])
-    
-    # Add horizontal separator line
-    separator_2 = Rectangle((0.01, 0.70), 0.98, 0.002, linewidth=1.5, edgecolor='black',
-                         facecolor='none', transform=fig.transFigure, zorder=-1)
-    fig.patches.extend([separator_2])
-    
     
     ax_table.set_title('Amounts Analysis', fontsize=12, pad=3)
     # KPI table
     kpi_data = [
         ["Total Paid Amount", f"${total_paid_last_month:,.2f}"],
         ["Average Daily", f"${avg_daily_paid:,.2f}"],
-        ["Highest Day", f"{max_day.strftime('%Y-%m-%d')} (${max_amount:,.2f})"]
+        ["Highest Day", f"{max_day.strftime('%Y-%m-%d')} (${max_amount:,.2f})" if max_day else "-"]
     ]
     
     ax_table.axis('off')
@@ -86,9 +53,6 @@ def total_amount_calc(merged_df, merchant_id):
         else:
             cell.set_facecolor('#f0f0f0')
     
-    # Add title for the entire visualization
-    fig.suptitle('Payment Analysis - Last 30 Days', fontsize=18, y=0.96)
-    
     # Main histogram plot
     bars = ax_chart.bar(
         daily_paid.index,
@@ -100,8 +64,8 @@ def total_amount_calc(merged_df, merchant_id):
     
     # Format x-axis
     ax_chart.xaxis.set_major_formatter(mdates.DateFormatter('%Y-%m-%d'))
-    ax_chart.xaxis.set_major_locator(mdates.DayLocator(interval=2))
-    plt.setp(ax_chart.get_xticklabels(), rotation=90)
+    ax_chart.xaxis.set_major_locator(day_locator(daily_paid, interval=2))
+    ax_chart.tick_params(axis='x', labelrotation=90)
     
     # Add labels and title
     ax_chart.set_title('Daily Paid Amounts', fontsize=14, pad=10)
@@ -134,10 +98,16 @@ def total_amount_calc(merged_df, merchant_id):
         )
         ax_chart.legend()
     
-    # Save as PNG file
-    plt.savefig('artifacts/payment_analysis_last_month.png', dpi=300, bbox_inches='tight')
-    print("Visualization saved as 'payment_analysis_last_month.png'")
+    # The caller decides where and how the page is saved
+    return fig
 
 if __name__ == "__main__":
-    total_amount_calc(merged_df, merchent_id=3)
+    import pandas as pd
+    from pipeline.metrics import metrics_from_frame
+    from pipeline.pages import load_plotting
+    from config import MOCK_DATA_PATH
+    load_plotting()
+    merged_df = pd.read_csv(MOCK_DATA_PATH)
+    fig = total_amount_calc(metrics_from_frame(merged_df, merchant_id=3).amount)
+    fig.savefig('artifacts/payment_analysis_last_month.png', dpi=300, bbox_inches='tight')
     print("Total amount calculation and visualization completed.")
\ No newline at end of file
@@ -1,62 +1,29 @@
-import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
 import matplotlib.dates as mdates
-from matplotlib.patches import Rectangle
+from pipeline.page_template import new_page, day_locator
 
-# Set style
-sns.set_style('whitegrid')
-
-# Load the merged DataFrame
-merged_df = pd.read_csv("Data/MOCK_DATA.csv")
-
-def total_count_calc(merged_df, merchant_id):
+def total_count_calc(count_metrics):
     """
-    This function calculates the total transaction count in the last month,
-    average daily transaction count, busiest and slowest days, and creates a
+    This function draws the total transaction count in the report window,
+    average daily transaction count, busiest and slowest days, and a
     visualization of daily transaction counts with KPIs.
+    All values come precomputed in count_metrics (see pipeline.metrics).
     """
-    # Convert payment_date to datetime
-    merged_df['payment_date'] = pd.to_datetime(merged_df['payment_date'])
-    merged_df = merged_df[merged_df['merchant_id'] == merchant_id]
-    # Filter data for the last month
-    last_month = merged_df[merged_df['payment_date'] >= (pd.to_datetime('today') - pd.DateOffset(months=1))]
-    
-    # Calculate transaction counts and KPIs
-    daily_counts_last_month = last_month.groupby(last_month['payment_date'].dt.date).size()
-    total_last_month = daily_counts_last_month.sum()
-    avg_daily_last_month = daily_counts_last_month.mean()
-    busiest_day = daily_counts_last_month.idxmax()
-    busiest_count = daily_counts_last_month.max()
-    slowest_day = daily_counts_last_month.idxmin()
-    slowest_count = daily_counts_last_month.min()
-    
-    # Create figure with subplots
-    fig = plt.figure(figsize=(8.27,11.69))
+    daily_counts_last_month = count_metrics.daily_counts
+    total_last_month = count_metrics.total_count
+    avg_daily_last_month = count_metrics.avg_daily_count
+    busiest_day = count_metrics.busiest_day
+    busiest_count = count_metrics.busiest_count
+    slowest_day = count_metrics.slowest_day
+    slowest_count = count_metrics.slowest_count
+    
+    # Create page with subplots
+    fig = new_page(f'Transaction Count Analysis - {count_metrics.window_title}', separator_y=0.70, title_y=0.97)
     gs = fig.add_gridspec(2, 1, height_ratios=[1, 3], hspace=0.3)  # 1:3 ratio for table:chart
     
     # Create axes
     ax_table = fig.add_subplot(gs[0])
     ax_chart = fig.add_subplot(gs[1])
     
-    # Create a surrounding box for both elements
-    box = Rectangle((0.01, 0.01), 0.98, 0.98, linewidth=2, edgecolor='black', facecolor='none',
-                    transform=fig.transFigure, zorder=-1)
-    fig.patches.extend([box])
-    
-    # Add horizontal separator line
-    separator_1 = Rectangle((0.01, 0.91), 0.98, 0.08, linewidth=1.5, edgecolor='black',
-                         facecolor='#b7cbbf', transform=fig.transFigure, zorder=-1)
-    fig.patches.extend([separator_1])
-    
-    # Add horizontal separator line
-    separator_2 = Rectangle((0.01, 0.70), 0.98, 0.002, linewidth=1.5, edgecolor='black',
-                         facecolor='none', transform=fig.transFigure, zorder=-1)
-    fig.patches.extend([separator_2])
-    
-    # Add title for the entire visualization
-    fig.suptitle('Transaction Count Analysis - Last 30 Days', fontsize=18, y=0.97)
-    
     # KPI table (top)
     ax_table.set_title('Count Analysis', fontsize=12, pad=3)
     ax_table.axis('off')
@@ -99,8 +66,8 @@ def total_count_calc(merged_df, merchant_id):
     
     # Format x-axis
     ax_chart.xaxis.set_major_formatter(mdates.DateFormatter('%Y-%m-%d'))
-    ax_chart.xaxis.set_major_locator(mdates.DayLocator(interval=1))
-    plt.setp(ax_chart.get_xticklabels(), rotation=90)
+    ax_chart.xaxis.set_major_locator(day_locator(daily_counts_last_month, interval=1))
+    ax_chart.tick_params(axis='x', labelrotation=90)
     
     # Add labels and title
     ax_chart.set_title('Daily Transaction Counts', fontsize=14, pad=10)
@@ -120,12 +87,18 @@ def total_count_calc(merged_df, merchant_id):
         )
     
     # Adjust layout
-    plt.tight_layout()
+    fig.tight_layout()
     
-    # Save as PNG file
-    plt.savefig('artifacts/transaction_count_analysis_last_month.png', dpi=300, bbox_inches='tight')
-    print("Visualization saved as 'transaction_count_analysis_last_month.png'")
+    # The caller decides where and how the page is saved
+    return fig
 
 if __name__ == "__main__":
-    total_count_calc(merged_df, 3)
+    import pandas as pd
+    from pipeline.metrics import metrics_from_frame
+    from pipeline.pages import load_plotting
+    from config import MOCK_DATA_PATH
+    load_plotting()
+    merged_df = pd.read_csv(MOCK_DATA_PATH)
+    fig = total_count_calc(metrics_from_frame(merged_df, merchant_id=3).count)
+    fig.savefig('artifacts/transaction_count_analysis_last_month.png', dpi=300, bbox_inches='tight')
     print("Total count calculation completed.")
\ No newline at end of file
@@ -1,61 +1,25 @@
-import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
-from datetime import datetime, timedelta
-from matplotlib.patches import Rectangle
 import matplotlib.dates as mdates
+from pipeline.page_template import new_page, day_locator
 
-# Set style
-sns.set_style('whitegrid')
-
-# Load the merged DataFrame
-merged_df = pd.read_csv("Data/MOCK_DATA.csv")
-def user_analysis_metrics(df, merged_df, merchant_id):
+def user_analysis_metrics(user_metrics):
     """
-    This function analyzes user metrics in the last month,
-    calculates total users, new users, market share, and creates a
+    This function draws user metrics in the report window,
+    total users, the window's unique, new and returning users,
+    market share, and a
     visualization of daily user counts with KPIs.
+    All values come precomputed in user_metrics (see pipeline.metrics).
     """
-    # Convert payment_date to datetime
-    merged_df['payment_date'] = pd.to_datetime(merged_df['payment_date'])
-    merged_df = merged_df[merged_df['merchant_id'] == merchant_id]
-    
-    # Prepare data
-    last_month_start = datetime.now() - timedelta(days=30)
-    total_users = merged_df['user_id'].nunique()
-    new_users = merged_df[merged_df['payment_date'] >= last_month_start]['user_id'].nunique()
-    
-    # For market share - replace with actual platform users
-    total_platform_users = df.shape[0]
-    market_share = (total_users / total_platform_users) * 100
-    
-    # Daily user counts for last month
-    daily_users = merged_df[merged_df['payment_date'] >= last_month_start].groupby(
-        merged_df['payment_date'].dt.date
-    )['user_id'].nunique()
-    
-    # Create figure
-    fig = plt.figure(figsize=(8.27,11.69))
+    total_users = user_metrics.total_users
+    window_users = user_metrics.window_users
+    new_users = user_metrics.new_users
+    returning_users = user_metrics.returning_users
+    market_share = user_metrics.market_share
+    daily_users = user_metrics.daily_users
+    
+    # Create page
+    fig = new_page(f'User Metrics Analysis - {user_metrics.window_title}', separator_y=0.66)
     gs = fig.add_gridspec(2, 1, height_ratios=[1, 2], hspace=0.3)
     
-    # Create surrounding box
-    box = Rectangle((0.01, 0.01), 0.98, 0.98, linewidth=2, edgecolor='black',
-                    facecolor='none', transform=fig.transFigure, zorder=-1)
-    fig.patches.extend([box])
-    
-    # Add horizontal separator line
-    separator_1 = Rectangle((0.01, 0.91), 0.98, 0.08, linewidth=1.5, edgecolor='black',
-                         facecolor='#b7cbbf', transform=fig.transFigure, zorder=-1)
-    fig.patches.extend([separator_1])
-    
-    # Add horizontal separator line
-    separator_2 = Rectangle((0.01, 0.66), 0.98, 0.002, linewidth=1.5, edgecolor='black',
-                         facecolor='none', transform=fig.transFigure, zorder=-1)
-    fig.patches.extend([separator_2])
-    
-    # Add main title
-    fig.suptitle('User Metrics Analysis - Last 30 Days', fontsize=18, y=0.96)
-    
     # --- KPI Table (Top) ---
     ax_table = fig.add_subplot(gs[0])
     ax_table.axis('off')
@@ -63,7 +27,8 @@ def user_analysis_metrics(df, merged_df, merchant_id):
     kpi_data = [
         ["Total Unique Users", f"{total_users:,}"],
         ["Market Share", f"{market_share:.1f}%"],
-        ["New Users Last 30 Days", f"{new_users:,}"]
+        [f"Users ({user_metrics.window_title})", f"{window_users:,}"],
+        ["New / Returning Users", f"{new_users:,} / {returning_users:,}"]
     ]
     
     kpi_table = ax_table.table(
@@ -90,9 +55,12 @@ def user_analysis_metrics(df, merged_df, merchant_id):
         elif i == 2:  # Market Share
             cell.set_facecolor('#FF9800')  # Orange
             cell.set_text_props(color='black', weight='bold')
-        elif i == 3:  # New Users
+        elif i == 3:  # Users in the window
             cell.set_facecolor('#F5F5DC')  # Purple
             cell.set_text_props(color='black', weight='bold')
+        elif i == 4:  # New and returning users
+            cell.set_facecolor('#E1F5FE')  # Light blue
+            cell.set_text_props(color='black', weight='bold')
     
     # --- Daily User Chart (Bottom) ---
     ax_chart = fig.add_subplot(gs[1])
@@ -124,8 +92,8 @@ def user_analysis_metrics(df, merged_df, merchant_id):
     
     # Format x-axis
     ax_chart.xaxis.set_major_formatter(mdates.DateFormatter('%Y-%m-%d'))
-    ax_chart.xaxis.set_major_locator(mdates.DayLocator(interval=3))
-    plt.setp(ax_chart.get_xticklabels(), rotation=45)
+    ax_chart.xaxis.set_major_locator(day_locator(daily_users, interval=3))
+    ax_chart.tick_params(axis='x', labelrotation=45)
     
     # Add value labels
     for bar in bars:
@@ -141,12 +109,18 @@ def user_analysis_metrics(df, merged_df, merchant_id):
             )
     
     
-    plt.tight_layout()
+    fig.tight_layout()
     
-    # Save as PNG
-    plt.savefig('artifacts/daily_user_metrics.png', dpi=300, bbox_inches='tight')
-    print("Visualization saved as 'daily_user_metrics.png'")
+    # The caller decides where and how the page is saved
+    return fig
 
 if __name__ == "__main__":
-    user_analysis_metrics(merged_df, merchent_id=3)
+    import pandas as pd
+    from pipeline.metrics import metrics_from_frame
+    from pipeline.pages import load_plotting
+    from config import MOCK_DATA_PATH
+    load_plotting()
+    merged_df = pd.read_csv(MOCK_DATA_PATH)
+    fig = user_analysis_metrics(metrics_from_frame(merged_df, merchant_id=3).users)
+    fig.savefig('artifacts/daily_user_metrics.png', dpi=300, bbox_inches='tight')
     print("User analysis completed successfully.")
\ No newline at end of file
@@ -0,0 +1,123 @@
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+import os
+import sys
+import pandas as pd
+
+# Add the root directory to sys.path
+root_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(root_path)
+from config import REPORT_WINDOW_DAYS
+
+# Named periods, resolved to the last complete one
+PERIODS = {"month": "M", "quarter": "Q", "year": "Y"}
+
+
+@dataclass
+class ReportWindow:
+    """The [start, end) window a report covers."""
+    start: datetime
+    end: datetime
+    title: str  # shown on the pages, e.g. "Last 30 Days" or "Q1 2025"
+    key: str  # identifies the window in cache keys
+
+
+def _period_title(period):
+    if period.freqstr.startswith("Q"):
+        return f"Q{period.quarter} {period.year}"
+    if period.freqstr.startswith("Y"):
+        return str(period.year)
+    return period.strftime("%B %Y")
+
+
+def _as_datetime(value, inclusive_end=False):
+    # Plain dates cover the whole day, so an end date includes its day
+    if isinstance(value, datetime):
+        return value
+    value = datetime.combine(value, datetime.min.time())
+    return value + timedelta(days=1) if inclusive_end else value
+
+
+def resolve_window(start=None, end=None, period=None, now=None):
+    """
+    Builds the report window from either:
+    - period: "month", "quarter" or "year" for the last complete one, or an
+      explicit period such as "2025-03", "2025Q1" or "2025";
+    - start and/or end: dates or datetimes, a date end includes its day and
+      a missing start means REPORT_WINDOW_DAYS before end;
+    - nothing: the last REPORT_WINDOW_DAYS days up to now.
+    Raises ValueError on an unknown period, a period given with start or
+    end, or an empty window.
+    """
+    now = now or datetime.now()
+    if period and (start is not None or end is not None):
+        raise ValueError("Give either a report period or start/end dates, not both.")
+    if period:
+        if period in PERIODS:
+            resolved = pd.Period(now, freq=PERIODS[period]) - 1
+        else:
+            resolved = pd.Period(period)
+            if resolved.freqstr[0] not in ("M", "Q", "Y"):
+                raise ValueError(f"Unsupported report period: {period}")
+        return ReportWindow(
+            start=resolved.start_time.to_pydatetime(),
+            end=(resolved + 1).start_time.to_pydatetime(),
+            title=_period_title(resolved),
+            key=f"{resolved.freqstr}:{resolved}"
+        )
+
+    if start is None and end is None:
+        return ReportWindow(
+            start=now - timedelta(days=REPORT_WINDOW_DAYS),
+            end=now,
+            title=f"Last {REPORT_WINDOW_DAYS} Days",
+            key=f"{REPORT_WINDOW_DAYS}d@{now.date().isoformat()}"
+        )
+
+    # An open end runs up to now and, like the default window, is keyed by day
+    end_key = end
+    end = _as_datetime(end, inclusive_end=True) if end is not None else now
+    start = _as_datetime(start) if start is not None else end - timedelta(days=REPORT_WINDOW_DAYS)
+    if start >= end:
+        raise ValueError("The report window must start before it ends.")
+    last_day = (end - timedelta(microseconds=1)).date()
+    return ReportWindow(
+        start=start,
+        end=end,
+        title=f"{start.date().isoformat()} to {last_day.isoformat()}",
+        key=f"{start.isoformat()}/{end.isoformat() if end_key is not None else '@' + now.date().isoformat()}"
+    )
+
+
+def time_slice(df, start, end):
+    """
+    Returns the rows of df paid in [start, end) as a positional slice.
+    df is sorted by payment_date first when it is not already, which the
+    loaders avoid by returning rows in payment_date order.
+    """
+    payment_date = df['payment_date']
+    if not payment_date.is_monotonic_increasing:
+        df = df.sort_values('payment_date', kind='stable')
+        payment_date = df['payment_date']
+    lower, upper = payment_date.searchsorted([pd.Timestamp(start), pd.Timestamp(end)])
+    return df.iloc[lower:upper]
+
+
+def merchant_time_index(df):
+    """
+    Sorts a multi-merchant frame by merchant_id, then payment_date, so
+    merchant_slice() and time_slice() can binary-search it.
+    """
+    if df['merchant_id'].is_monotonic_increasing:
+        return df
+    return df.sort_values(['merchant_id', 'payment_date'], kind='stable')
+
+
+def merchant_slice(df, merchant_id):
+    """
+    Returns one merchant's rows of a frame sorted by merchant_time_index().
+    """
+    merchant_ids = df['merchant_id']
+    lower = merchant_ids.searchsorted(merchant_id, side='left')
+    upper = merchant_ids.searchsorted(merchant_id, side='right')
+    return df.iloc[lower:upper]
@@ -0,0 +1,42 @@
+import os
+import sys
+import pandas as pd
+import pytest
+
+# Add the root directory to sys.path
+root_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(root_path)
+from pipeline.metrics import metrics_from_frame
+from pipeline.pages import warm_up
+from config import MOCK_DATA_PATH
+
+
+def pytest_addoption(parser):
+    parser.addoption("--runslow", action="store_true", help="Also run the tests marked slow")
+
+
+def pytest_configure(config):
+    config.addinivalue_line("markers", "slow: long-running test, run with --runslow")
+
+
+def pytest_collection_modifyitems(config, items):
+    if config.getoption("--runslow"):
+        return
+    skip_slow = pytest.mark.skip(reason="slow, run with --runslow")
+    for item in items:
+        if "slow" in item.keywords:
+            item.add_marker(skip_slow)
+
+
+@pytest.fixture(scope="session")
+def report_metrics():
+    """
+    Metrics of the busiest merchant of the sample export over its last
+    year of payments, with the plotting stack already loaded.
+    """
+    warm_up()
+    frame = pd.read_csv(MOCK_DATA_PATH)
+    frame["payment_date"] = pd.to_datetime(frame["payment_date"], format="%m/%d/%Y %H:%M")
+    merchant_id = frame["merchant_id"].value_counts().index[0]
+    end = frame["payment_date"].max().normalize() + pd.Timedelta(days=1)
+    return metrics_from_frame(frame, merchant_id, start=end - pd.Timedelta(days=365), end=end)
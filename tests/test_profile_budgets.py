@@ -0,0 +1,17 @@
+import pytest
+from pipeline.create_pdf import PDF_PROFILES
+from pipeline.pages import render_report
+
+
+@pytest.mark.parametrize("backend", ["vector", "raster"])
+@pytest.mark.parametrize("profile", list(PDF_PROFILES))
+def test_report_stays_within_profile_budget(report_metrics, backend, profile):
+    pdf = render_report(report_metrics, backend, profile)
+    assert pdf.startswith(b"%PDF")
+    assert len(pdf) <= PDF_PROFILES[profile].max_bytes
+
+
+def test_screen_profile_shrinks_vector_reports(report_metrics):
+    # Base-14 fonts instead of embedded ones
+    screen = render_report(report_metrics, "vector", "screen")
+    assert len(screen) < len(render_report(report_metrics, "vector", "print"))
@@ -0,0 +1,46 @@
+import gc
+import os
+import resource
+import matplotlib.pyplot as plt
+import pytest
+from pipeline.pages import render_report
+
+# Reports rendered by the full soak (about 4s each), run with --runslow.
+# The default run renders a short one.
+SOAK_REPORTS = int(os.getenv("REPORT_SOAK_REPORTS", 300))
+SHORT_SOAK_REPORTS = 20
+
+# Allowed resident memory growth over the whole soak. One leaked page
+# canvas alone is about 4 MB at the screen profile's 100 dpi.
+MAX_GROWTH_BYTES = 20 * 1024 * 1024
+
+# Resident memory swings by about as much from report to report as the
+# allocator reuses the page buffers, so the soak compares the lowest
+# reading of its first and last FLOOR_REPORTS reports: a leak raises it.
+FLOOR_REPORTS = 5
+
+
+def _rss_bytes():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+@pytest.mark.parametrize("reports", [
+    SHORT_SOAK_REPORTS,
+    pytest.param(SOAK_REPORTS, marks=pytest.mark.slow, id="soak")
+])
+def test_repeated_reports_keep_memory_flat(report_metrics, reports):
+    # The first reports fill matplotlib's font and text caches
+    for _ in range(3):
+        render_report(report_metrics, "raster", "screen")
+    rss = []
+    for _ in range(reports):
+        render_report(report_metrics, "raster", "screen")
+        gc.collect()
+        rss.append(_rss_bytes())
+
+    assert min(rss[-FLOOR_REPORTS:]) - min(rss[:FLOOR_REPORTS]) < MAX_GROWTH_BYTES
+    assert plt.get_fignums() == []